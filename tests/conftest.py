@@ -0,0 +1,3 @@
+# tordl.config loads the search engines, which import tordl.core, so it has
+# to be imported before tordl.core is.
+import tordl.config  # noqa: F401
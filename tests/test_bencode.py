@@ -0,0 +1,53 @@
+import hashlib
+
+import pytest
+
+from tordl.bencode import BencodeError, decode, encode, parse_torrent
+from tordl.bencode import torrent_to_magnet
+
+# Keys of the info dictionary aren't sorted, as in some torrent files found in
+# the wild, re-encoding it would give a different info hash.
+INFO = b'd4:name8:file.iso6:lengthi1024e12:piece lengthi256ee'
+TORRENT = (
+    b'd8:announce13:udp://a:1/ann13:announce-listll13:udp://a:1/ann'
+    b'el13:udp://b:2/annee4:info' + INFO + b'e'
+)
+
+
+def test_encode_decode():
+    value = {'b': [1, b'x', {'c': -2}], 'a': 'text'}
+    data = encode(value)
+
+    assert data == b'd1:a4:text1:bli1e1:xd1:ci-2eeee'
+    assert decode(data) == {
+        b'a': b'text', b'b': [1, b'x', {b'c': -2}]
+    }
+
+
+@pytest.mark.parametrize('data', [b'i1', b'4:abc', b'l1:a', b'x', b'i1ei2e'])
+def test_decode_invalid(data):
+    # BencodeError is a ValueError, int() and bytes.index() raise the latter.
+    with pytest.raises(ValueError):
+        decode(data)
+
+
+def test_parse_torrent_hashes_raw_info():
+    torrent, info_hash = parse_torrent(TORRENT)
+
+    assert torrent[b'info'][b'name'] == b'file.iso'
+    assert info_hash == hashlib.sha1(INFO).hexdigest()
+    assert info_hash != hashlib.sha1(encode(torrent[b'info'])).hexdigest()
+
+
+@pytest.mark.parametrize('data', [b'l4:infoe', b'd8:announce1:ae'])
+def test_parse_torrent_invalid(data):
+    with pytest.raises(BencodeError):
+        parse_torrent(data)
+
+
+def test_torrent_to_magnet():
+    assert torrent_to_magnet(TORRENT) == (
+        'magnet:?xt=urn:btih:%s&dn=file.iso'
+        '&tr=udp%%3A%%2F%%2Fa%%3A1%%2Fann&tr=udp%%3A%%2F%%2Fb%%3A2%%2Fann' %
+        hashlib.sha1(INFO).hexdigest()
+    )
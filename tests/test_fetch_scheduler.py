@@ -0,0 +1,77 @@
+import asyncio
+
+from tordl.core import FetchScheduler
+
+
+def test_per_host_limit():
+    async def run():
+        scheduler = FetchScheduler(concurrent=10, per_host=2)
+        running = {}
+        peak = {}
+
+        def job(host):
+            async def fn():
+                running[host] = running.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), running[host])
+                await asyncio.sleep(0.01)
+                running[host] -= 1
+                return host
+            return fn
+
+        futures = [
+            scheduler.submit(job(host), host)
+            for host in ('a', 'b') for _ in range(5)
+        ]
+        return await asyncio.gather(*futures), peak
+
+    results, peak = asyncio.run(run())
+
+    assert results == ['a'] * 5 + ['b'] * 5
+    assert peak == {'a': 2, 'b': 2}
+
+
+def test_priority_order():
+    async def run():
+        scheduler = FetchScheduler(concurrent=1, per_host=1)
+        order = []
+
+        def job(name):
+            async def fn():
+                order.append(name)
+            return fn
+
+        await asyncio.gather(
+            scheduler.submit(job('low'), 'a', priority=2),
+            scheduler.submit(job('high'), 'b', priority=0),
+            scheduler.submit(job('mid'), 'a', priority=1),
+            scheduler.submit(job('mid2'), 'b', priority=1)
+        )
+        return order
+
+    assert asyncio.run(run()) == ['high', 'mid', 'mid2', 'low']
+
+
+def test_cancel():
+    async def run():
+        scheduler = FetchScheduler(concurrent=1, per_host=1)
+        started = []
+        release = asyncio.Event()
+
+        def job(name):
+            async def fn():
+                started.append(name)
+                await release.wait()
+                return name
+            return fn
+
+        running = scheduler.submit(job('running'), 'a')
+        queued = scheduler.submit(job('queued'), 'a')
+        last = scheduler.submit(job('last'), 'a')
+        # Let the first job start.
+        await asyncio.sleep(0.01)
+        scheduler.cancel([running, queued])
+        release.set()
+        result = await last
+        return started, result, scheduler.running, scheduler.queued
+
+    assert asyncio.run(run()) == (['running', 'last'], 'last', 0, 0)
@@ -0,0 +1,51 @@
+import base64
+
+import pytest
+
+from tordl.core import MagnetIndex, SearchResult, parse_info_hash
+from tordl.engines import Dl1337xto, TpbParty
+
+INFO_HASH = bytes(range(20)).hex()
+BASE32 = base64.b32encode(bytes(range(20))).decode()
+
+
+@pytest.mark.parametrize('magnet_url', [
+    'magnet:?xt=urn:btih:%s&dn=x' % INFO_HASH,
+    'magnet:?xt=urn:btih:%s&dn=x' % INFO_HASH.upper(),
+    'magnet:?dn=x&xt=urn:btih:%s' % BASE32,
+    'magnet:?dn=x&xt=urn:btih:%s' % BASE32.lower(),
+])
+def test_parse_info_hash(magnet_url):
+    assert parse_info_hash(magnet_url) == INFO_HASH
+
+
+@pytest.mark.parametrize('magnet_url', [
+    None,
+    '',
+    'https://example.com/file.torrent',
+    'magnet:?xt=urn:btih:1234',
+    'magnet:?xt=urn:btih:%s' % ('1' * 32),
+])
+def test_parse_info_hash_invalid(magnet_url):
+    assert parse_info_hash(magnet_url) is None
+
+
+def _result(engine, link, seeders, magnet_url):
+    return SearchResult(engine, link, link, seeders, 1, '1 MB', magnet_url)
+
+
+def test_merge_same_info_hash():
+    first = _result(
+        TpbParty(), '/a', 5, 'magnet:?xt=urn:btih:%s' % INFO_HASH
+    )
+    same = _result(
+        Dl1337xto(), '/b', 9, 'magnet:?xt=urn:btih:%s&tr=x' % BASE32
+    )
+    other = _result(
+        Dl1337xto(), '/c', 1, 'magnet:?xt=urn:btih:%s' % ('f' * 40)
+    )
+
+    assert MagnetIndex().merge([first, same, other]) == [first, other]
+    assert first.origins == [TpbParty, Dl1337xto]
+    assert first.links == ['/a', '/b']
+    assert first.seeders == 9
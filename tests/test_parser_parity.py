@@ -0,0 +1,81 @@
+import inspect
+
+import pytest
+
+import tordl.config as cfg
+from tordl import engines
+from tordl.bench import DETAIL_FIXTURE, SEARCH_FIXTURE, load_fixture
+from tordl.core import BaseDl
+
+pytest.importorskip('lxml')
+
+ENGINES = [
+    cls for _, cls in inspect.getmembers(engines, inspect.isclass)
+    if issubclass(cls, BaseDl) and cls is not BaseDl
+]
+PARSERS = ('html.parser', 'lxml')
+
+
+def _parse(monkeypatch, dl_class, method, scope, page, parser, scoped):
+    monkeypatch.setattr(cfg, 'HTML_PARSER', parser)
+    dl = dl_class()
+    if not scoped:
+        setattr(dl, scope, None)
+    return getattr(dl, method)(page)
+
+
+def _rows(search_results):
+    return [
+        (sr.name, sr.links, sr.magnet_url, sr.seeders, sr.leechers, sr.size)
+        for sr in search_results
+    ]
+
+
+@pytest.mark.parametrize('dl_class', ENGINES, ids=lambda c: c.NAME)
+def test_search_parity(monkeypatch, dl_class):
+    page = load_fixture(dl_class.NAME, SEARCH_FIXTURE)
+    if page is None:
+        pytest.skip('No stored search page')
+
+    outputs = {
+        (parser, scoped): _rows(_parse(
+            monkeypatch,
+            dl_class,
+            '_process_search',
+            'SEARCH_SCOPE',
+            page,
+            parser,
+            scoped
+        ))
+        for parser in PARSERS for scoped in (True, False)
+    }
+
+    expected = outputs['html.parser', False]
+    assert expected
+    for key, rows in outputs.items():
+        assert rows == expected, key
+
+
+@pytest.mark.parametrize('dl_class', ENGINES, ids=lambda c: c.NAME)
+def test_magnet_page_parity(monkeypatch, dl_class):
+    page = load_fixture(dl_class.NAME, DETAIL_FIXTURE)
+    if page is None:
+        pytest.skip('No stored detail page')
+
+    outputs = {
+        (parser, scoped): _parse(
+            monkeypatch,
+            dl_class,
+            '_parse_magnet_page',
+            'MAGNET_SCOPE',
+            page,
+            parser,
+            scoped
+        )
+        for parser in PARSERS for scoped in (True, False)
+    }
+
+    expected = outputs['html.parser', False]
+    assert expected
+    for key, magnet_url in outputs.items():
+        assert magnet_url == expected, key
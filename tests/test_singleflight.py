@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from tordl.singleflight import SingleFlight
+
+
+def test_shares_call_in_flight():
+    async def run():
+        flights = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        results = await asyncio.gather(
+            flights.do('a', fn), flights.do('a', fn), flights.do('b', fn)
+        )
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(run())
+
+    assert results == [('result', False), ('result', True), ('result', False)]
+    assert len(calls) == 2
+    assert flights.to_dict() == {
+        'calls': 3, 'flights': 2, 'deduplicated': 1, 'in_flight': 0
+    }
+
+
+def test_shares_error():
+    async def run():
+        flights = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        results = await asyncio.gather(
+            flights.do('a', fn), flights.do('a', fn), return_exceptions=True
+        )
+        return flights, results
+
+    flights, results = asyncio.run(run())
+
+    assert [str(r) for r in results] == ['failed', 'failed']
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.in_flight == 0
+
+
+def test_call_runs_while_somebody_waits():
+    async def run():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def fn():
+            started.set()
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        first = asyncio.ensure_future(flights.do('a', fn))
+        second = asyncio.ensure_future(flights.do('a', fn))
+        await started.wait()
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == (('result', True), True)
+
+
+def test_last_waiter_cancels_call():
+    async def run():
+        flights = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fn():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flights.do('a', fn))
+        await started.wait()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flights.in_flight
+
+    assert asyncio.run(run()) == 0
@@ -51,7 +51,91 @@ def parse_args():
         dest='cfg_request_timeout',
         default=cfg.REQUEST_TIMEOUT,
         type=float,
-        help='Search / fetch magnet URL request timeout.'
+        help='Search / fetch magnet URL request timeout, with adaptive timeouts'
+             ' only until enough response times of the search engine are '
+             'known.'
+    )
+    ap.add_argument(
+        '--no-adaptive-timeout',
+        dest='cfg_adaptive_timeout',
+        default=cfg.ADAPTIVE_TIMEOUT,
+        action='store_false',
+        help='Always use --timeout instead of timeouts derived from response '
+             'times of each search engine.'
+    )
+    ap.add_argument(
+        '--no-hedge',
+        dest='cfg_hedge_requests',
+        default=cfg.HEDGE_REQUESTS,
+        action='store_false',
+        help='Don\'t send a duplicate request when a search engine doesn\'t '
+             'respond within its usual (95th percentile) response time.'
+    )
+    ap.add_argument(
+        '-D',
+        '--deadline',
+        dest='cfg_search_deadline',
+        default=cfg.SEARCH_DEADLINE,
+        type=float,
+        help='Latency budget of the whole search (all pages and magnet links) '
+             'in seconds, 0 means no deadline. Search engines which don\'t '
+             'make it in time are skipped and the result is flagged as '
+             'partial.'
+    )
+    ap.add_argument(
+        '--rate-limit',
+        dest='cfg_http_rate_limit',
+        default=cfg.HTTP_RATE_LIMIT,
+        type=float,
+        help='Maximum number of requests per second sent to one host, '
+             'requests over the limit wait for their turn. 0 means no limit.'
+    )
+    ap.add_argument(
+        '--race-mirrors',
+        dest='cfg_mirror_race',
+        default=cfg.MIRROR_RACE,
+        action='store_true',
+        help='Send the first request of search engines with mirrors to two '
+             'mirrors and stick to the one responding first, instead of timing '
+             'all mirrors.'
+    )
+    ap.add_argument(
+        '--retries',
+        dest='cfg_retry_max',
+        default=cfg.RETRY_MAX,
+        type=int,
+        help='How many times a request failed with a transient error (timeout,'
+             ' connection reset, 429, 5xx, ...) is retried.'
+    )
+    ap.add_argument(
+        '--no-cache',
+        dest='cfg_use_http_cache',
+        default=cfg.USE_HTTP_CACHE,
+        action='store_false',
+        help='Bypass the on-disk cache of search engine responses stored in '
+             '%s.' % cfg.CFG_HTTP_CACHE_FILE
+    )
+    ap.add_argument(
+        '--record',
+        dest='cfg_cassette_record',
+        default=cfg.CASSETTE_RECORD,
+        help='Record all search engine responses (with timing) to this '
+             'cassette file (gzipped JSON lines).'
+    )
+    ap.add_argument(
+        '--replay',
+        dest='cfg_cassette_replay',
+        default=cfg.CASSETTE_REPLAY,
+        help='Serve search engine responses from a cassette file recorded with '
+             '--record instead of the network.'
+    )
+    ap.add_argument(
+        '--replay-time-scale',
+        dest='cfg_cassette_time_scale',
+        default=cfg.CASSETTE_TIME_SCALE,
+        type=float,
+        help='Multiply response times recorded in the --replay cassette, 0 '
+             'replays without delays.'
     )
     ap.add_argument(
         '-g',
@@ -83,6 +167,41 @@ def parse_args():
         help='If --fetch-missing-magnet-links is turned on, tordl will be '
              'fetching N magnet links concurrently to speed up the process.'
     )
+    ap.add_argument(
+        '-k',
+        '--magnet-top-k',
+        dest='cfg_magnet_top_k',
+        default=cfg.MAGNET_TOP_K,
+        type=int,
+        help='If --fetch-missing-magnet-links is turned on, fetch magnet links '
+             'only for the best K search results (see --magnet-top-k-sort), 0 '
+             'means all of them.'
+    )
+    ap.add_argument(
+        '--magnet-top-k-sort',
+        dest='cfg_magnet_top_k_sort',
+        default=cfg.MAGNET_TOP_K_SORT,
+        choices=('seeders', 'leechers', 'size'),
+        help='Sort key used to pick the best K search results for '
+             '--magnet-top-k.'
+    )
+    ap.add_argument(
+        '--no-magnet-cache',
+        dest='cfg_use_magnet_cache',
+        default=cfg.USE_MAGNET_CACHE,
+        action='store_false',
+        help='Don\'t use the cache of already fetched magnet links stored in '
+             '%s.' % cfg.CFG_MAGNET_CACHE_FILE
+    )
+    ap.add_argument(
+        '--parse-pool',
+        dest='cfg_parse_pool',
+        default=cfg.PARSE_POOL,
+        choices=('thread', 'process', 'none'),
+        help='Where to parse search engine pages, in a pool of threads, '
+             'processes (scales across CPU cores) or directly on the event '
+             'loop.'
+    )
     ap.add_argument(
         '--exclude-search-off',
         dest='cfg_use_exclude_search',
@@ -146,6 +265,96 @@ def parse_args():
              'currently selected ones.'
     )
     """
+    Mode Parser Benchmark
+    """
+    ap.add_argument(
+        '--bench',
+        action='store_true',
+        default=False,
+        help='Benchmark parsing of stored search engine pages (no network), '
+             'supply additional positional arguments as search engines to '
+             'benchmark.'
+    )
+    ap.add_argument(
+        '--bench-repeat',
+        default=20,
+        type=int,
+        help='Parse every stored page N times.'
+    )
+    ap.add_argument(
+        '--bench-output',
+        default=None,
+        help='Write benchmark results in JSON to this file.'
+    )
+    ap.add_argument(
+        '--bench-baseline',
+        default=None,
+        help='Compare benchmark results with results stored by --bench-output, '
+             'exit with 1 on regressions.'
+    )
+    ap.add_argument(
+        '--bench-threshold',
+        default=20,
+        type=float,
+        help='Percent by which parsing may get slower or use more memory than '
+             'in --bench-baseline.'
+    )
+    """
+    Mode Replay Server
+    """
+    ap.add_argument(
+        '--replay-server',
+        action='store_true',
+        default=False,
+        help='Run a local stand-in for the torrent sites serving stored pages '
+             'of every search engine, see --replay-url.'
+    )
+    ap.add_argument(
+        '--replay-bind',
+        default='127.0.0.1:57100',
+        type=str,
+        help='Replay Server bind address and port. (ADDRESS:PORT format).'
+    )
+    ap.add_argument(
+        '--replay-latency',
+        default=0.0,
+        type=float,
+        help='Replay Server response latency in seconds.'
+    )
+    ap.add_argument(
+        '--replay-jitter',
+        default=0.0,
+        type=float,
+        help='Replay Server response latency jitter (+-) in seconds.'
+    )
+    ap.add_argument(
+        '--replay-error-rate',
+        default=0.0,
+        type=float,
+        help='Probability of Replay Server failing a request with 503.'
+    )
+    ap.add_argument(
+        '--replay-rate-limit',
+        default=0,
+        type=float,
+        help='Requests per second per search engine Replay Server answers '
+             'before throttling with 429, 0 means no limit.'
+    )
+    ap.add_argument(
+        '--replay-pages',
+        default=1,
+        type=int,
+        help='Number of search result pages Replay Server serves, the '
+             'following ones are empty.'
+    )
+    ap.add_argument(
+        '--replay-url',
+        dest='cfg_replay_url',
+        default=cfg.REPLAY_URL,
+        help='Send search engine requests to Replay Server running at this '
+             'URL (e.g. http://127.0.0.1:57100) instead of the torrent sites.'
+    )
+    """
     Mode Direct Download
     """
     ap.add_argument(
@@ -197,6 +406,14 @@ def parse_args():
         type=str,
         help='RPC Server bind address and port. (ADDRESS:PORT format).'
     )
+    ap.add_argument(
+        '--rpc-json-strings',
+        dest='cfg_rpc_json_strings',
+        default=cfg.RPC_JSON_STRINGS,
+        action='store_true',
+        help='RPC Server returns search results as JSON strings (to be '
+             'decoded once more), like older versions.'
+    )
     """
     Run Modes Generic
     """
@@ -208,6 +425,13 @@ def parse_args():
         action='store_true',
         help='Print JSON in pretty format if using --api mode.'
     )
+    ap.add_argument(
+        '--stream',
+        default=False,
+        action='store_true',
+        help='In --api and --rpc-client modes, print results of every search '
+             'engine as soon as they arrive, one JSON document per line.'
+    )
 
     parsed = ap.parse_args(sys.argv[1:])
     return parsed
@@ -228,12 +452,31 @@ if __name__ == "__main__":
         func.direct_download(term)
     elif parsed_args.test_search_engines:
         func.test_search_engines(parsed_args.test_all, term)
+    elif parsed_args.replay_server:
+        func.run_replay_server(
+            parsed_args.replay_bind,
+            parsed_args.replay_latency,
+            parsed_args.replay_jitter,
+            parsed_args.replay_error_rate,
+            parsed_args.replay_rate_limit,
+            parsed_args.replay_pages
+        )
+    elif parsed_args.bench:
+        func.run_bench(
+            parsed_args.search,
+            parsed_args.bench_repeat,
+            parsed_args.bench_output,
+            parsed_args.bench_baseline,
+            parsed_args.bench_threshold
+        )
+    elif parsed_args.api and parsed_args.stream:
+        func.run_api_stream(term, parsed_args.cfg_pretty_json)
     elif parsed_args.api:
         print(func.run_api(term, parsed_args.cfg_pretty_json))
     elif parsed_args.rpc_server:
         func.run_rpc_server()
     elif parsed_args.rpc_client:
-        func.run_rpc_client(term)
+        func.run_rpc_client(term, stream=parsed_args.stream)
     else:
         func.run_curses_ui(term)
 
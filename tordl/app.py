@@ -11,7 +11,8 @@ from threading import Thread, Lock
 from time import sleep
 
 from tordl import config as cfg, func, core
-from tordl.core import SearchResult, DlFacade, SearchProgress
+from tordl.core import SearchResult, DlFacade, SearchProgress, MagnetIndex
+from tordl.core import SearchCursor
 
 
 class BaseScrollableWindow(object):
@@ -340,6 +341,7 @@ class EngineSelectionWindow(BaseScrollableWindow):
 
         super().__init__(screen, items)
 
+        self._downloader = downloader
         self._active_engines = downloader.engines
 
         self.active = False
@@ -429,7 +431,7 @@ class EngineSelectionWindow(BaseScrollableWindow):
             if e in self._active_engines.keys():
                 del self._active_engines[e]
             else:
-                self._active_engines[e] = e()
+                self._active_engines[e] = self._downloader.mk_engine(e)
 
     def _mk_win_w(self):
         a = [
@@ -450,8 +452,8 @@ class EngineSelectionWindow(BaseScrollableWindow):
         self._window.bkgd(' ', curses.color_pair(1) | curses.A_BOLD)
 
     def _mk_item_caption(self, item):
-        return ('%s (%s)' % (
-            item.BASE_URL, item.NAME
+        return ('%s (%s) %s' % (
+            item.BASE_URL, item.NAME, self._downloader.health[item.NAME]
         )).split('//')[1].replace('www.', '')
 
 
@@ -556,6 +558,32 @@ class ItemWindow(BaseScrollableWindow):
             if self._items:
                 self._items.append(self.LoadMoreItem())
 
+    def add_items(self, search_results, append=False):
+        if not self._items:
+            self.set_items(search_results)
+        elif append:
+            self.set_items(search_results, True)
+        else:
+            lm = self._items.pop()
+            self._items = self._sort_items(
+                self._items + search_results, self.SORT_SEEDERS, True
+            )
+            self._items.append(lm)
+
+    def visible_items(self):
+        if not self._items:
+            return set()
+        h, _ = self._screen.getmaxyx()
+        return set(
+            self._items[self._draw_start_index:self._draw_start_index + h - 2]
+        )
+
+    def aggregate_items(self, aggregate_fn):
+        if self._items:
+            self._items = aggregate_fn(self._items)
+            if self._position >= len(self._items):
+                self._position = len(self._items) - 1
+
     def draw(self,
              h,
              w,
@@ -741,6 +769,8 @@ class App(object):
         self._lock = Lock()
 
         self._downloader = DlFacade(self._loop)
+        self._magnet_index = MagnetIndex()
+        self._cursor = None
 
         self._should_exit = False
 
@@ -818,13 +848,19 @@ class App(object):
 
         curses.doupdate()
 
-        if asyncio.all_tasks(self._loop):
-            for p in self._pending_tasks:
-                self._loop.call_soon_threadsafe(p.cancel)
+        # Wait only for tasks of the UI, background tasks of the downloader
+        # (circuit breaker probes) are cancelled by closing it.
+        pending = list(self._pending_tasks)
+        for p in pending:
+            self._loop.call_soon_threadsafe(p.cancel)
 
-        while asyncio.all_tasks(self._loop):
+        while not all(p.done() for p in pending):
             sleep(0.1)
 
+        asyncio.run_coroutine_threadsafe(
+            self._downloader.close(), self._loop
+        ).result()
+
         self._loop.call_soon_threadsafe(self._loop.stop)
         self._loop_thread.join()
 
@@ -927,60 +963,65 @@ class App(object):
         search_progress = SearchProgress()
         self._bottom_bar.set_search_progress(search_progress)
         future = asyncio.run_coroutine_threadsafe(
-            self._downloader.fetch_pages(
-                search_term,
-                search_progress
-            ),
+            self._stream_results(search_term, search_progress),
             self._loop
         )
-        future.add_done_callback(
-            partial(self._on_fetch_pages, search_term=search_term)
-        )
+        future.add_done_callback(self._on_fetch_results)
         self._pending_tasks.append(future)
 
-    def _on_fetch_pages(self, future, search_term):
-        if cfg.FETCH_MISSING_MAGNET_LINKS:
+    async def _stream_results(self, search_term, search_progress):
+        load_more = search_term is None
+        if not load_more:
+            self._magnet_index = MagnetIndex()
+            self._cursor = SearchCursor(search_term)
+        elif self._cursor is None:
+            return
+
+        items = []
+        async for batch in self._downloader.fetch_pages_iter(
+                self._cursor,
+                search_progress,
+                cfg.AGGREGATE_SAME_MAGNET_LINKS,
+                self._magnet_index
+        ):
             self._lock.acquire()
-            self._pending_tasks.remove(future)
+            self._item_window.add_items(batch, load_more)
+            self._lock.release()
+            items.extend(batch)
 
+        if cfg.FETCH_MISSING_MAGNET_LINKS and items:
+            self._lock.acquire()
             search_progress = SearchProgress()
             self._bottom_bar.set_fetching_magnet_urls()
             self._bottom_bar.set_search_progress(search_progress)
+            visible = self._item_window.visible_items()
+            self._lock.release()
 
-            future = asyncio.run_coroutine_threadsafe(
-                self._downloader.fetch_magnet_links(
-                    future.result(),
-                    cfg.FETCH_MAGNET_LINKS_CONCURRENCE,
-                    search_progress
-                ),
-                self._loop
+            # Fetch magnet links of the rows on the screen first.
+            await self._downloader.fetch_magnet_links(
+                items,
+                cfg.FETCH_MAGNET_LINKS_CONCURRENCE,
+                search_progress,
+                priority=lambda sr: (sr not in visible, -sr.seeders),
+                top_k=cfg.MAGNET_TOP_K
             )
-            future.add_done_callback(
-                partial(self._on_fetch_magnet_urls, search_term=search_term)
-            )
-            self._pending_tasks.append(future)
-            self._lock.release()
-        else:
-            self._on_fetch_magnet_urls(future, search_term)
 
-    def _on_fetch_magnet_urls(self, future, search_term):
+            if cfg.AGGREGATE_SAME_MAGNET_LINKS:
+                self._lock.acquire()
+                self._item_window.aggregate_items(self._magnet_index.merge)
+                self._lock.release()
+
+    def _on_fetch_results(self, future):
         self._lock.acquire()
         if future in self._pending_tasks:
             self._pending_tasks.remove(future)
         try:
-            items = future.result()
+            future.result()
         except CancelledError:
-            items = []
-
-        if cfg.AGGREGATE_SAME_MAGNET_LINKS:
-            if search_term is not None:
-                items = self._downloader.aggregate_same_magnets(items)
-            else:
-                items = self._downloader.aggregate_same_magnets(
-                    self._item_window.items, items
-                )
+            pass
 
-        self._item_window.set_items(items, search_term is None)
+        if self._item_window.items is None:
+            self._item_window.set_items([])
         self._bottom_bar.set_action_complete()
         if self._start_search_str:
             self._init_search_in_prg = False
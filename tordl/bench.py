@@ -0,0 +1,193 @@
+import gc
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import tordl.config as cfg
+from tordl import engines
+from tordl.core import BaseDl, get_html_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SEARCH_FIXTURE = 'search.html'
+DETAIL_FIXTURE = 'detail.html'
+
+
+def load_fixture(engine_name, fixture):
+    """
+    Return stored page `fixture` of search engine `engine_name` or None.
+    """
+    path = os.path.join(FIXTURES_DIR, engine_name, fixture)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+class ParserBenchmark(object):
+    """
+    Times parsing of stored search and detail pages of every engine from
+    tordl.engines without touching the network, so engine parsing can be
+    measured and compared against a baseline.
+    """
+
+    def __init__(self, engine_names=None, repeat=20):
+        self._engine_names = engine_names
+        self._repeat = repeat
+
+    def run(self):
+        results = {}
+        for dl_class in self._engine_classes():
+            dl = dl_class()
+            result = {}
+
+            search = load_fixture(dl.NAME, SEARCH_FIXTURE)
+            if search is not None:
+                result['search'] = self._measure(dl._process_search, search)
+
+            detail = load_fixture(dl.NAME, DETAIL_FIXTURE)
+            if detail is not None:
+                result['detail'] = self._measure(dl._parse_magnet_page, detail)
+
+            if result:
+                results[dl.NAME] = result
+
+        return {
+            'meta': {
+                'python': platform.python_version(),
+                'html_parser': get_html_parser(cfg.HTML_PARSER),
+                'repeat': self._repeat,
+                'time': time.time()
+            },
+            'results': results
+        }
+
+    def _engine_classes(self):
+        for _, obj in inspect.getmembers(engines, inspect.isclass):
+            if issubclass(obj, BaseDl) and obj is not BaseDl:
+                if self._engine_names is None or \
+                        obj.NAME in self._engine_names:
+                    yield obj
+
+    def _measure(self, parse_fn, page):
+        tracemalloc.start()
+        try:
+            result = parse_fn(page)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        # Garbage collection runs at random points of the runs, like timeit
+        # it's kept out of the timings.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        timings = []
+        try:
+            for _ in range(self._repeat):
+                t = time.perf_counter()
+                parse_fn(page)
+                timings.append(time.perf_counter() - t)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        timings.sort()
+
+        if isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 1 if result else 0
+        mean = sum(timings) / len(timings)
+
+        return {
+            'rows': rows,
+            'page_bytes': len(page.encode('utf-8')),
+            'mean': mean,
+            'median': timings[len(timings) // 2],
+            'min': timings[0],
+            'per_row': mean / rows if rows else None,
+            'rows_per_sec': rows / mean if mean else None,
+            'peak_memory': peak
+        }
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Compare benchmark `report` with `baseline` report, return a list of
+    regressions - parsers which got slower (fastest run, the least noisy one)
+    or hungrier (peak memory) by more than `threshold`, or return a different
+    number of rows.
+    """
+    regressions = []
+    for engine, pages in report['results'].items():
+        for page, m in pages.items():
+            b = baseline['results'].get(engine, {}).get(page)
+            if b is None:
+                continue
+
+            if m['rows'] != b['rows']:
+                regressions.append(
+                    '%s %s: rows %d -> %d' %
+                    (engine, page, b['rows'], m['rows'])
+                )
+            for key in ('min', 'peak_memory'):
+                if b[key] and m[key] > b[key] * (1 + threshold):
+                    regressions.append(
+                        '%s %s: %s +%.1f%%' % (
+                            engine, page, key, (m[key] / b[key] - 1) * 100
+                        )
+                    )
+
+    return regressions
+
+
+def format_report(report):
+    lines = [
+        '%-8s %-7s %5s %10s %12s %10s %10s' % (
+            'Engine', 'Page', 'Rows', 'Median ms', 'Per row us', 'Rows/s',
+            'Peak KiB'
+        )
+    ]
+    for engine, pages in sorted(report['results'].items()):
+        for page, m in pages.items():
+            lines.append(
+                '%-8s %-7s %5d %10.3f %12s %10s %10.1f' % (
+                    engine,
+                    page,
+                    m['rows'],
+                    m['median'] * 1000,
+                    '%.1f' % (m['per_row'] * 10 ** 6) if m['per_row'] else '-',
+                    '%.0f' % m['rows_per_sec'] if m['rows_per_sec'] else '-',
+                    m['peak_memory'] / 1024
+                )
+            )
+
+    return '\n'.join(lines)
+
+
+def run(
+        engine_names=None,
+        repeat=20,
+        output=None,
+        baseline=None,
+        threshold=0.2
+):
+    report = ParserBenchmark(engine_names, repeat).run()
+    print(format_report(report))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(report, json.load(f), threshold)
+        if regressions:
+            print('\nRegressions against %s:' % baseline)
+            for r in regressions:
+                print('  %s' % r)
+            sys.exit(1)
+        print('\nNo regressions against %s.' % baseline)
@@ -0,0 +1,113 @@
+import hashlib
+from urllib.parse import quote
+
+
+class BencodeError(ValueError):
+    pass
+
+
+def decode(data):
+    value, i = _decode(data, 0)
+    if i != len(data):
+        raise BencodeError('Trailing data at %d' % i)
+    return value
+
+
+def encode(value):
+    if isinstance(value, int):
+        return b'i%de' % value
+    elif isinstance(value, str):
+        return encode(value.encode('utf-8'))
+    elif isinstance(value, bytes):
+        return b'%d:%s' % (len(value), value)
+    elif isinstance(value, list):
+        return b'l%se' % b''.join(encode(v) for v in value)
+    elif isinstance(value, dict):
+        # Keys are sorted, so the same info dictionary has the same hash.
+        return b'd%se' % b''.join(
+            encode(k) + encode(value[k]) for k in sorted(
+                value, key=lambda k: k.encode('utf-8') if isinstance(k, str)
+                else k
+            )
+        )
+    raise BencodeError('Cannot encode %s' % type(value).__name__)
+
+
+def parse_torrent(data):
+    """
+    Decode .torrent file `data`, return the metainfo dictionary and
+    the info hash (hex) computed from the raw bytes of the `info` dictionary.
+    """
+    if data[:1] != b'd':
+        raise BencodeError('Torrent file is not a dictionary')
+
+    torrent = {}
+    info_span = None
+    i = 1
+    while data[i:i + 1] != b'e':
+        key, i = _decode(data, i)
+        start = i
+        torrent[key], i = _decode(data, i)
+        if key == b'info':
+            info_span = start, i
+
+    if info_span is None:
+        raise BencodeError('Torrent file has no info dictionary')
+
+    return torrent, hashlib.sha1(data[info_span[0]:info_span[1]]).hexdigest()
+
+
+def torrent_to_magnet(data):
+    torrent, info_hash = parse_torrent(data)
+
+    magnet_url = 'magnet:?xt=urn:btih:%s' % info_hash
+
+    info = torrent[b'info']
+    if isinstance(info, dict) and isinstance(info.get(b'name'), bytes):
+        magnet_url += '&dn=%s' % quote(
+            info[b'name'].decode('utf-8', 'replace')
+        )
+
+    trackers = []
+    if isinstance(torrent.get(b'announce'), bytes):
+        trackers.append(torrent[b'announce'])
+    for tier in torrent.get(b'announce-list') or []:
+        if isinstance(tier, list):
+            trackers.extend(t for t in tier if isinstance(t, bytes))
+    for tracker in dict.fromkeys(trackers):
+        magnet_url += '&tr=%s' % quote(
+            tracker.decode('utf-8', 'replace'), safe=''
+        )
+
+    return magnet_url
+
+
+def _decode(data, i):
+    c = data[i:i + 1]
+    if c == b'i':
+        end = data.index(b'e', i)
+        return int(data[i + 1:end]), end + 1
+    elif c == b'l':
+        result = []
+        i += 1
+        while data[i:i + 1] != b'e':
+            value, i = _decode(data, i)
+            result.append(value)
+        return result, i + 1
+    elif c == b'd':
+        result = {}
+        i += 1
+        while data[i:i + 1] != b'e':
+            key, i = _decode(data, i)
+            result[key], i = _decode(data, i)
+        return result, i + 1
+    elif c.isdigit():
+        colon = data.index(b':', i)
+        start = colon + 1
+        end = start + int(data[i:colon])
+        if end > len(data):
+            raise BencodeError('String exceeds data length')
+        return data[start:end], end
+    else:
+        # Also covers the unexpected end of data.
+        raise BencodeError('Invalid bencode at %d' % i)
@@ -0,0 +1,293 @@
+import sqlite3
+import time
+from collections import OrderedDict
+
+import tordl.config as cfg
+
+
+class SqliteCache(object):
+    SCHEMA = None
+
+    def __init__(self, path):
+        self._path = path
+        self._db = None
+
+    @property
+    def db(self):
+        # Connect lazily, the cache is usually created in a different thread
+        # than the event loop using it.
+        if self._db is None:
+            self._db = sqlite3.connect(self._path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(self.SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class HttpCache(SqliteCache):
+    """
+    On-disk HTTP response cache keyed by search engine name and URL, with
+    least recently used eviction once the cache exceeds `max_size` bytes.
+    Access times of cache hits are kept in memory and written with the next
+    `put` (or on `close`), so a hit doesn't cost a disk write.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS http_cache (
+            engine TEXT NOT NULL,
+            url TEXT NOT NULL,
+            body BLOB NOT NULL,
+            content_type TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            stored REAL NOT NULL,
+            accessed REAL NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (engine, url)
+        );
+        CREATE INDEX IF NOT EXISTS http_cache_accessed
+            ON http_cache (accessed);
+    '''
+
+    class Entry(object):
+        def __init__(self, body, content_type, etag, last_modified, stored):
+            self.body = body
+            self.content_type = content_type
+            self.etag = etag
+            self.last_modified = last_modified
+            self.stored = stored
+
+        @property
+        def age(self):
+            return time.time() - self.stored
+
+        @property
+        def validators(self):
+            headers = {}
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+            return headers
+
+    def __init__(self, path=None, max_size=None):
+        super().__init__(path or cfg.CFG_HTTP_CACHE_FILE)
+        self._max_size = cfg.HTTP_CACHE_MAX_SIZE \
+            if max_size is None else max_size
+        self._accessed = {}
+
+    def get(self, engine, url):
+        row = self.db.execute(
+            'SELECT body, content_type, etag, last_modified, stored '
+            'FROM http_cache WHERE engine = ? AND url = ?',
+            (engine, url)
+        ).fetchone()
+        if row is None:
+            return None
+
+        self._accessed[engine, url] = time.time()
+        return self.Entry(*row)
+
+    def put(
+            self,
+            engine,
+            url,
+            body,
+            content_type=None,
+            etag=None,
+            last_modified=None
+    ):
+        now = time.time()
+        self._accessed.pop((engine, url), None)
+        with self.db:
+            self._flush_accessed()
+            self.db.execute(
+                'INSERT OR REPLACE INTO http_cache '
+                '(engine, url, body, content_type, etag, last_modified, '
+                'stored, accessed, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    engine,
+                    url,
+                    body,
+                    content_type,
+                    etag,
+                    last_modified,
+                    now,
+                    now,
+                    len(body)
+                )
+            )
+        self._evict()
+
+    def revalidated(self, engine, url):
+        now = time.time()
+        self._accessed.pop((engine, url), None)
+        with self.db:
+            self.db.execute(
+                'UPDATE http_cache SET stored = ?, accessed = ? '
+                'WHERE engine = ? AND url = ?',
+                (now, now, engine, url)
+            )
+
+    def clear(self):
+        self._accessed.clear()
+        with self.db:
+            self.db.execute('DELETE FROM http_cache')
+
+    def close(self):
+        if self._db is not None and self._accessed:
+            with self.db:
+                self._flush_accessed()
+        super().close()
+
+    def _flush_accessed(self):
+        self.db.executemany(
+            'UPDATE http_cache SET accessed = ? WHERE engine = ? AND url = ?',
+            [(t, engine, url) for (engine, url), t in self._accessed.items()]
+        )
+        self._accessed.clear()
+
+    def _evict(self):
+        size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM http_cache'
+        ).fetchone()[0]
+        if size <= self._max_size:
+            return
+
+        evict = []
+        for engine, url, entry_size in self.db.execute(
+                'SELECT engine, url, size FROM http_cache ORDER BY accessed'
+        ).fetchall():
+            if size <= self._max_size:
+                break
+            evict.append((engine, url))
+            size -= entry_size
+
+        with self.db:
+            self.db.executemany(
+                'DELETE FROM http_cache WHERE engine = ? AND url = ?', evict
+            )
+
+
+class MagnetCache(SqliteCache):
+    """
+    Durable mapping of search engine detail page links to magnet links,
+    which never changes once a torrent is published.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS magnet_cache (
+            engine TEXT NOT NULL,
+            link TEXT NOT NULL,
+            magnet_url TEXT NOT NULL,
+            stored REAL NOT NULL,
+            PRIMARY KEY (engine, link)
+        );
+    '''
+
+    def __init__(self, path=None):
+        super().__init__(path or cfg.CFG_MAGNET_CACHE_FILE)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def get(self, engine, link):
+        row = self.db.execute(
+            'SELECT magnet_url FROM magnet_cache WHERE engine = ? AND link = ?',
+            (engine, link)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return row[0]
+
+    def put(self, engine, link, magnet_url):
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO magnet_cache '
+                '(engine, link, magnet_url, stored) VALUES (?, ?, ?, ?)',
+                (engine, link, magnet_url, time.time())
+            )
+
+    def clear(self):
+        with self.db:
+            self.db.execute('DELETE FROM magnet_cache')
+
+
+class ResultCache(object):
+    """
+    In-memory cache of search results, least recently used entries are
+    dropped above `size` entries. Entries are fresh for `ttl` seconds and can
+    be served `stale` seconds longer while they're being refreshed.
+    """
+
+    class Entry(object):
+        def __init__(self, value):
+            self.value = value
+            self.stored = time.monotonic()
+
+        @property
+        def age(self):
+            return time.monotonic() - self.stored
+
+    def __init__(self, size=None, ttl=None, stale=None):
+        self.size = cfg.RESULT_CACHE_SIZE if size is None else size
+        self.ttl = cfg.RESULT_CACHE_TTL if ttl is None else ttl
+        self.stale = cfg.RESULT_CACHE_STALE if stale is None else stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+    def get(self, key, max_age=None):
+        """
+        Return the value of `key` and whether it's stale, or (None, False).
+        With `max_age` (seconds), only a value not older is returned, never
+        a stale one.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age
+            if age <= (self.ttl if max_age is None else min(self.ttl, max_age)):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value, False
+            if age <= self.ttl + self.stale:
+                if max_age is None:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    return entry.value, True
+            else:
+                del self._entries[key]
+
+        self.misses += 1
+        return None, False
+
+    def put(self, key, value):
+        self._entries[key] = self.Entry(value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
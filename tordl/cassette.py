@@ -0,0 +1,118 @@
+import base64
+import gzip
+import json
+import time
+from collections import defaultdict, deque
+
+import tordl.config as cfg
+
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+class Cassette(object):
+    """
+    Recorded HTTP responses (URL, status, headers, body, timing) stored as
+    gzipped JSON lines. In 'record' mode responses are appended to `path`, in
+    'replay' mode they are served back in the recorded order, with the
+    recorded response time multiplied by `time_scale` (0 means no delay).
+    """
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    class Entry(object):
+        def __init__(self, url, status, headers, body, elapsed):
+            self.url = url
+            self.status = status
+            self.headers = headers
+            self.body = body
+            self.elapsed = elapsed
+
+        @property
+        def content_type(self):
+            return self.headers.get('Content-Type')
+
+    def __init__(self, path, mode, time_scale=1.0):
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+
+        self._started = time.monotonic()
+        self._file = None
+        self._entries = defaultdict(deque)
+        if mode == self.REPLAY:
+            self._load()
+
+    @staticmethod
+    def mk():
+        """
+        Cassette set up in config (CASSETTE_RECORD or CASSETTE_REPLAY) or None.
+        """
+        if cfg.CASSETTE_REPLAY:
+            return Cassette(
+                cfg.CASSETTE_REPLAY, Cassette.REPLAY, cfg.CASSETTE_TIME_SCALE
+            )
+        if cfg.CASSETTE_RECORD:
+            return Cassette(cfg.CASSETTE_RECORD, Cassette.RECORD)
+        return None
+
+    @property
+    def recording(self):
+        return self.mode == self.RECORD
+
+    def play(self, url):
+        """
+        Next recorded response of `url`, the last one is repeated once all of
+        them were played. Raises CassetteMiss for unknown URLs.
+        """
+        entries = self._entries.get(url)
+        if not entries:
+            raise CassetteMiss(url)
+
+        return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def delay(self, entry):
+        return entry.elapsed * self.time_scale
+
+    def record(self, engine, url, status, headers, body, elapsed):
+        if self._file is None:
+            self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+
+        line = {
+            'engine': engine,
+            'url': url,
+            'status': status,
+            'headers': {
+                h: headers[h] for h in RECORDED_HEADERS if h in headers
+            },
+            'elapsed': round(elapsed, 6),
+            'at': round(time.monotonic() - self._started, 6)
+        }
+        try:
+            line['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            line['body_b64'] = base64.b64encode(body).decode('ascii')
+
+        self._file.write(json.dumps(line) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                e = json.loads(line)
+                if 'body_b64' in e:
+                    body = base64.b64decode(e['body_b64'])
+                else:
+                    body = e['body'].encode('utf-8')
+                self._entries[e['url']].append(
+                    self.Entry(
+                        e['url'], e['status'], e['headers'], body, e['elapsed']
+                    )
+                )
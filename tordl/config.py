@@ -10,6 +10,9 @@ CFG_DIR = os.path.join(os.path.expanduser('~'), save_config_path('torrentdl'))
 CFG_FILE = os.path.join(CFG_DIR, 'config.json')
 CFG_ENGINES_FILE = os.path.join(CFG_DIR, 'engines.py')
 CFG_HISTORY_FILE = os.path.join(CFG_DIR, 'search_history.txt')
+CFG_HTTP_CACHE_FILE = os.path.join(CFG_DIR, 'http_cache.sqlite')
+CFG_MAGNET_CACHE_FILE = os.path.join(CFG_DIR, 'magnet_cache.sqlite')
+CFG_MIRRORS_FILE = os.path.join(CFG_DIR, 'mirrors.json')
 
 CFG_SEARCH_ENGINES_DEFAULT = [
     '1337x',
@@ -27,23 +30,74 @@ SEARCH_ENGINES = CFG_SEARCH_ENGINES_DEFAULT
 
 TORRENT_CLIENT_CMD = 'qbittorrent %s'
 
+REPLAY_URL = ''
+BASE_URL_OVERRIDE = {}
+
 HISTORY_MAX_LENGTH = 100
 PAGE_NUM_DOWNLOAD = 1
 REQUEST_TIMEOUT = 5
+ADAPTIVE_TIMEOUT = True
+ADAPTIVE_TIMEOUT_FACTOR = 3
+ADAPTIVE_TIMEOUT_MIN = 1
+ADAPTIVE_TIMEOUT_MAX = 0
+LATENCY_WINDOW = 100
+HEDGE_REQUESTS = True
+HEDGE_PERCENTILE = 95
+SEARCH_DEADLINE = 0
+RETRY_MAX = 2
+RETRY_BACKOFF_BASE = 0.25
+RETRY_BACKOFF_MAX = 2
+RETRY_BUDGET = 10
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOL_DOWN = 60
+MIRROR_RACE = False
+MIRROR_TTL = 86400
+
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 10
+HTTP_DNS_CACHE_TTL = 300
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_RATE_LIMIT = 10
+HTTP_RATE_BURST = 20
+HTTP_RATE_LIMIT_HOST = {}
+
+USE_HTTP_CACHE = True
+HTTP_CACHE_MAX_SIZE = 50 * 1024 ** 2
+HTTP_CACHE_TTL = 600
+HTTP_CACHE_ENGINE_TTL = {}
+RESULT_CACHE_SIZE = 100
+RESULT_CACHE_TTL = 60
+RESULT_CACHE_STALE = 300
+SEARCH_CONCURRENCY = 10
+SEARCH_MANY_MAX_TERMS = 100
+
+CASSETTE_RECORD = ''
+CASSETTE_REPLAY = ''
+CASSETTE_TIME_SCALE = 1.0
 
 AGGREGATE_SAME_MAGNET_LINKS = True
 FETCH_MISSING_MAGNET_LINKS = False
 FETCH_MAGNET_LINKS_CONCURRENCE = 20
+FETCH_MAGNET_LINKS_PER_HOST = 4
+MAGNET_TOP_K = 0
+MAGNET_TOP_K_SORT = 'seeders'
+USE_MAGNET_CACHE = True
 
 USE_EXCLUDE_SEARCH = True
 EXCLUDE_SEARCH_DELIMITER = '::-'
 
+HTML_PARSER = 'auto'
+PARSE_POOL = 'thread'
+PARSE_POOL_SIZE = 0
+PARSE_TIMEOUT = 10
+
 PRETTY_JSON = False
 
 RPC_BIND_ADDRESS = '127.0.0.1'
 RPC_BIND_PORT = 57000
 RPC_USER = ''
 RPC_PASS = ''
+RPC_JSON_STRINGS = False
 
 
 def mk_cfg():
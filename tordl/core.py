@@ -1,22 +1,98 @@
 import asyncio
+import base64
+import binascii
+import heapq
 import importlib
 import inspect
-import json
-import os
+import multiprocessing
+import re
 import sys
-import tempfile
 import time
-from asyncio import Task, Event, FIRST_COMPLETED, Lock
+import uuid
+from asyncio import Task, Lock, FIRST_COMPLETED
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 from importlib import machinery, util
+from itertools import count
+from urllib.parse import urlsplit
 
 try:
     import uvloop
 except Exception:
     uvloop = None
 
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from bs4 import BeautifulSoup
 
 import tordl.config as cfg
+import tordl.jsonenc as jsonenc
+from tordl.bencode import torrent_to_magnet
+from tordl.cache import HttpCache, MagnetCache, ResultCache
+from tordl.cassette import Cassette
+from tordl.health import HealthBoard
+from tordl.mirrors import MirrorTable
+from tordl.ratelimit import HostRateLimiter
+from tordl.retry import RetryBudget, backoff, current_budget, is_retryable
+from tordl.retry import with_budget
+from tordl.singleflight import SingleFlight
+
+
+RE_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+@lru_cache()
+def get_html_parser(name):
+    """
+    Resolve BeautifulSoup tree builder `name`, 'auto' picks lxml when it's
+    installed and falls back to html.parser.
+    """
+    if name != 'auto':
+        return name
+
+    return 'lxml' if util.find_spec('lxml') else 'html.parser'
+
+
+def decode_body(body, content_type):
+    """
+    Decode `body` with the charset from the Content-Type header, so the HTML
+    parser doesn't have to detect the encoding. Without a (valid) charset
+    `body` is returned untouched.
+    """
+    m = RE_CHARSET.search(content_type or '')
+    if m:
+        try:
+            return body.decode(m.group(1))
+        except (LookupError, UnicodeDecodeError):
+            pass
+
+    return body
+
+
+async def first_success(tasks, on_failure=None):
+    """
+    Return the first of `tasks` finishing without an error and cancel the
+    others. `on_failure` is called with every failed task, when all of them
+    fail the last error is raised.
+    """
+    pending = set(tasks)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task
+                error = task.exception()
+                if on_failure is not None:
+                    on_failure(task)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise error
 
 
 def mk_loop():
@@ -47,6 +123,8 @@ class SearchResult(object):
         self.leechers = int(leechers)
         self.size = size.replace(' ', '').encode('ascii', 'ignore').decode()
         self.magnet_url = magnet_url
+        # Search result page the result comes from.
+        self.referer = None
 
         sb = self.size.lower()
         if 'kb' in sb:
@@ -68,6 +146,223 @@ class SearchResult(object):
                 self.size_b = 0.0
 
 
+RE_BTIH = re.compile(r'xt=urn:btih:([0-9a-z]+)', re.IGNORECASE)
+
+
+def parse_info_hash(magnet_url):
+    """
+    Return BitTorrent info hash of a magnet link as lower case hex string (both
+    hex and base32 `btih` forms are accepted) or None.
+    """
+    m = RE_BTIH.search(magnet_url) if magnet_url else None
+    if m:
+        h = m.group(1)
+        if len(h) == 40:
+            return h.lower()
+        elif len(h) == 32:
+            try:
+                return base64.b32decode(h.upper()).hex()
+            except binascii.Error:
+                pass
+    return None
+
+
+class MagnetIndex(object):
+    """
+    Index of search results by info hash, merges results of the same torrent
+    (origins, links, seeders, leechers) in O(1) per result.
+    """
+
+    def __init__(self, search_results=None):
+        self._index = {}
+        if search_results:
+            self.merge(search_results)
+
+    def __len__(self):
+        return len(self._index)
+
+    def merge(self, search_results):
+        """
+        Index `search_results`, merge those with an already indexed info hash
+        into the indexed ones and return the rest.
+        """
+        result = []
+        for sr in search_results:
+            key = self._mk_key(sr)
+            if key is None:
+                result.append(sr)
+                continue
+
+            indexed = self._index.get(key)
+            if indexed is None:
+                self._index[key] = sr
+                result.append(sr)
+            elif indexed is sr:
+                result.append(sr)
+            else:
+                self._merge_result(indexed, sr)
+
+        return result
+
+    @staticmethod
+    def _mk_key(search_result):
+        if not search_result.magnet_url:
+            return None
+        # Magnet link without info hash (or a link to a torrent file), fall
+        # back to exact match.
+        return parse_info_hash(search_result.magnet_url) or \
+            search_result.magnet_url
+
+    @staticmethod
+    def _merge_result(search_result, other):
+        search_result.origins.extend(other.origins)
+        search_result.links.extend(other.links)
+        if other.seeders > search_result.seeders:
+            search_result.seeders = other.seeders
+        if other.leechers > search_result.leechers:
+            search_result.leechers = other.leechers
+
+
+SORT_KEYS = {
+    'seeders': lambda sr: sr.seeders,
+    'leechers': lambda sr: sr.leechers,
+    'size': lambda sr: getattr(sr, 'size_b', 0.0)
+}
+
+
+class SearchResults(list):
+    """
+    List of search results, `partial` if some search engines didn't make it
+    before the search deadline.
+    """
+
+    def __init__(self, iterable=(), partial=False, missed_engines=None):
+        super().__init__(iterable)
+        self.partial = partial
+        self.missed_engines = missed_engines or []
+
+
+class Deadline(object):
+    """
+    Latency budget of a whole search (all pages and magnet links), records
+    search engines which didn't make it in time (the search is `partial`) and
+    those left out of the search.
+    """
+
+    def __init__(self, timeout=None):
+        if timeout is None:
+            timeout = cfg.SEARCH_DEADLINE
+        self._expires = time.monotonic() + timeout if timeout else None
+        self._missed_engines = []
+        self._late_engines = []
+
+    @property
+    def remaining(self):
+        if self._expires is None:
+            return None
+        return max(0.0, self._expires - time.monotonic())
+
+    @property
+    def partial(self):
+        return len(self._late_engines) > 0
+
+    @property
+    def missed_engines(self):
+        return self._missed_engines
+
+    def miss(self, engine_names):
+        """
+        Record search engines cut off by the deadline.
+        """
+        engine_names = list(engine_names)
+        for name in engine_names:
+            if name not in self._late_engines:
+                self._late_engines.append(name)
+        self.skip(engine_names)
+
+    def skip(self, engine_names):
+        """
+        Record search engines left out of the search, e.g. with an open
+        circuit, without making the search partial.
+        """
+        for name in engine_names:
+            if name not in self._missed_engines:
+                self._missed_engines.append(name)
+
+    def apply(self, search_results):
+        if isinstance(search_results, SearchResults):
+            search_results.partial = search_results.partial or self.partial
+            for name in self._missed_engines:
+                if name not in search_results.missed_engines:
+                    search_results.missed_engines.append(name)
+        return search_results
+
+    @staticmethod
+    def mk(deadline=None):
+        if isinstance(deadline, Deadline):
+            return deadline
+        return Deadline(deadline)
+
+
+class SearchCursor(object):
+    """
+    State of one search: the expression, excluded words (see
+    USE_EXCLUDE_SEARCH), the next result page and search engines without more
+    pages. Search engines and DlFacade don't keep any search state, so one
+    facade can run any number of searches at once, each with its own cursor.
+    """
+
+    def __init__(self, search_term):
+        self.id = uuid.uuid4().hex
+        self.expression, self.exclude = self._parse_exclude(search_term)
+        self.next_page = 1
+        self.exhausted = set()
+
+    def fork(self):
+        """
+        Copy of the cursor with its own id, continuing the search on its own.
+        """
+        cursor = SearchCursor(None)
+        cursor.expression = self.expression
+        cursor.exclude = list(self.exclude)
+        cursor.next_page = self.next_page
+        cursor.exhausted = set(self.exhausted)
+        return cursor
+
+    def take_pages(self, num):
+        """
+        Reserve the next `num` result pages, return their numbers.
+        """
+        pages = range(self.next_page, self.next_page + num)
+        self.next_page += num
+        return pages
+
+    def filter_excluded(self, search_results):
+        if not self.exclude:
+            return search_results
+
+        return [
+            r for r in search_results
+            if not any(e in r.name for e in self.exclude)
+        ]
+
+    @staticmethod
+    def mk(search_term):
+        if isinstance(search_term, SearchCursor):
+            return search_term
+        return SearchCursor(search_term)
+
+    @staticmethod
+    def _parse_exclude(search_term):
+        if cfg.USE_EXCLUDE_SEARCH and search_term:
+            a = [
+                e.strip(' ') for e in
+                search_term.split(cfg.EXCLUDE_SEARCH_DELIMITER)
+            ]
+            return a[0], a[1:]
+        return search_term, []
+
+
 class SearchProgress(object):
     def __init__(self):
         self.max_ = 1
@@ -88,67 +383,763 @@ class SearchProgress(object):
         return self._percent
 
 
+class HttpError(Exception):
+    def __init__(self, url, status):
+        super().__init__('HTTP %d (%s)' % (status, url))
+        self.url = url
+        self.status = status
+
+
+class HttpClient(object):
+    """
+    Long-lived HTTP session shared by all search engines, so connections
+    (TCP + TLS) are kept alive and DNS lookups are cached between requests.
+    The underlying ClientSession is created lazily, because it has to be
+    created inside a running event loop. Requests to every host are rate
+    limited (see HostRateLimiter), requests over the limit are queued.
+    """
+
+    def __init__(
+            self,
+            limit=None,
+            limit_per_host=None,
+            dns_cache_ttl=None,
+            keepalive_timeout=None,
+            cache=None,
+            cassette=None,
+            rate_limiter=None
+    ):
+        self._limit = cfg.HTTP_CONNECTION_LIMIT \
+            if limit is None else limit
+        self._limit_per_host = cfg.HTTP_CONNECTION_LIMIT_PER_HOST \
+            if limit_per_host is None else limit_per_host
+        self._dns_cache_ttl = cfg.HTTP_DNS_CACHE_TTL \
+            if dns_cache_ttl is None else dns_cache_ttl
+        self._keepalive_timeout = cfg.HTTP_KEEPALIVE_TIMEOUT \
+            if keepalive_timeout is None else keepalive_timeout
+        self._cache = cache
+        self._cassette = cassette
+        self._rate_limiter = rate_limiter or HostRateLimiter()
+
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self._limit,
+                    limit_per_host=self._limit_per_host,
+                    ttl_dns_cache=self._dns_cache_ttl,
+                    keepalive_timeout=self._keepalive_timeout
+                ),
+                timeout=ClientTimeout(cfg.REQUEST_TIMEOUT)
+            )
+        return self._session
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def cassette(self):
+        return self._cassette
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    async def get(
+            self,
+            url,
+            headers=None,
+            timeout=None,
+            cache_name=None,
+            cache_ttl=None,
+            decode=False,
+            on_response=None,
+            rate_key=None
+    ):
+        """
+        Fetch `url`, with `cache_name` the response is cached for `cache_ttl`
+        seconds, stale responses are revalidated if the site sent an ETag or
+        Last-Modified header. With `decode` the body is decoded to str when the
+        charset is known from the Content-Type header. With a cassette, the
+        cache is bypassed and responses are recorded or replayed.
+        `on_response` is called with the status and response time of responses
+        not served from the cache (excluding the time spent waiting for the
+        rate limiter). `rate_key` is the rate limiter bucket, by default the
+        host of `url`. Raises HttpError on 4xx and 5xx responses.
+        """
+        if self._cassette is not None and not self._cassette.recording:
+            return await self._play(url, decode, on_response)
+
+        if cache_ttl is None:
+            cache_ttl = cfg.HTTP_CACHE_TTL
+        cache = self._cache \
+            if cache_name and cache_ttl > 0 and self._cassette is None else None
+
+        entry = cache.get(cache_name, url) if cache else None
+        if entry:
+            if entry.age < cache_ttl:
+                return decode_body(entry.body, entry.content_type) \
+                    if decode else entry.body
+            headers = dict(headers or {})
+            headers.update(entry.validators)
+
+        await self._rate_limiter.acquire(url, rate_key)
+        started = time.monotonic()
+        async with self.session.get(
+                url,
+                headers=headers,
+                timeout=ClientTimeout(timeout or cfg.REQUEST_TIMEOUT)
+        ) as response:
+            if on_response is not None:
+                on_response(response.status, time.monotonic() - started)
+            if entry and response.status == 304:
+                cache.revalidated(cache_name, url)
+                body, content_type = entry.body, entry.content_type
+            else:
+                body = await response.read()
+                content_type = response.headers.get('Content-Type')
+                if self._cassette is not None:
+                    self._cassette.record(
+                        cache_name,
+                        url,
+                        response.status,
+                        response.headers,
+                        body,
+                        time.monotonic() - started
+                    )
+                if response.status == 429:
+                    retry_after = response.headers.get('Retry-After', '')
+                    self._rate_limiter.pause(
+                        url,
+                        int(retry_after) if retry_after.isdigit() else None,
+                        rate_key
+                    )
+                if response.status >= 400:
+                    raise HttpError(url, response.status)
+                if cache and response.status == 200:
+                    cache.put(
+                        cache_name,
+                        url,
+                        body,
+                        content_type,
+                        response.headers.get('ETag'),
+                        response.headers.get('Last-Modified')
+                    )
+
+            return decode_body(body, content_type) if decode else body
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._cache is not None:
+            self._cache.close()
+        if self._cassette is not None:
+            self._cassette.close()
+
+    async def _play(self, url, decode, on_response=None):
+        entry = self._cassette.play(url)
+        delay = self._cassette.delay(entry)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if on_response is not None:
+            on_response(entry.status, delay)
+        if entry.status >= 400:
+            raise HttpError(url, entry.status)
+
+        return decode_body(entry.body, entry.content_type) \
+            if decode else entry.body
+
+
+class FetchScheduler(object):
+    """
+    Runs submitted coroutines with a global and a per-host concurrency limit,
+    jobs with the lowest `priority` first. Any number of callers can share one
+    scheduler.
+    """
+
+    def __init__(self, concurrent=None, per_host=None):
+        self.concurrent = cfg.FETCH_MAGNET_LINKS_CONCURRENCE \
+            if concurrent is None else concurrent
+        self.per_host = cfg.FETCH_MAGNET_LINKS_PER_HOST \
+            if per_host is None else per_host
+
+        self._queues = {}
+        self._running = {}
+        self._tasks = {}
+        self._counter = count()
+        self._dispatch_scheduled = False
+
+    @property
+    def running(self):
+        return sum(self._running.values())
+
+    @property
+    def queued(self):
+        return sum(
+            1 for q in self._queues.values() for job in q if not job[-1].done()
+        )
+
+    def submit(self, coro_fn, host=None, priority=0):
+        """
+        Schedule `coro_fn()`, return a future of its result. Cancelling the
+        future cancels the job.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._queues.setdefault(host, []),
+            (priority, next(self._counter), coro_fn, future)
+        )
+        # Dispatch on the next loop iteration, so jobs submitted together are
+        # started in the order of their priority.
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+
+        return future
+
+    def cancel(self, futures):
+        """
+        Cancel jobs of `futures`.
+        """
+        for f in futures:
+            f.cancel()
+
+    def _dispatch(self):
+        self._dispatch_scheduled = False
+        while self.running < self.concurrent:
+            best = None
+            for host, queue in self._queues.items():
+                # Drop jobs cancelled while waiting.
+                while queue and queue[0][-1].done():
+                    heapq.heappop(queue)
+                if queue and self._running.get(host, 0) < self.per_host:
+                    if best is None or queue[0] < self._queues[best][0]:
+                        best = host
+
+            if best is None:
+                break
+
+            _, _, coro_fn, future = heapq.heappop(self._queues[best])
+            self._start(best, coro_fn, future)
+
+    def _start(self, host, coro_fn, future):
+        self._running[host] = self._running.get(host, 0) + 1
+        task = asyncio.create_task(coro_fn())
+        self._tasks[future] = task
+        task.add_done_callback(partial(self._on_done, host, future))
+        future.add_done_callback(partial(self._on_future_done, task))
+
+    def _on_done(self, host, future, task):
+        self._running[host] -= 1
+        del self._tasks[future]
+        if not future.done():
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self._dispatch()
+
+    @staticmethod
+    def _on_future_done(task, future):
+        if future.cancelled():
+            task.cancel()
+
+
+def load_engines_module(path=None):
+    """
+    Load search engines module from `path` (config copy by default) as
+    `engines_mod`. The module is registered in sys.modules, so engine classes
+    can be pickled to parse workers.
+    """
+    path = path or cfg.CFG_ENGINES_FILE
+    engines_mod = sys.modules.get('engines_mod')
+    if engines_mod is not None and engines_mod.__file__ == path:
+        return engines_mod
+
+    loader = importlib.machinery.SourceFileLoader('engines_mod', path)
+    spec = importlib.util.spec_from_loader('engines_mod', loader)
+    engines_mod = importlib.util.module_from_spec(spec)
+    loader.exec_module(engines_mod)
+    sys.modules['engines_mod'] = engines_mod
+
+    return engines_mod
+
+
+def _init_parse_worker(engines_file, html_parser):
+    cfg.HTML_PARSER = html_parser
+    load_engines_module(engines_file)
+
+
+def _parse_in_worker(dl_class, method, response):
+    # Engines hold HTTP sessions and other unpicklable state, a bare instance
+    # is enough to parse a page.
+    dl = dl_class.__new__(dl_class)
+    return getattr(dl, method)(response)
+
+
+class ParsePool(object):
+    """
+    Runs HTML parsing of search engines off the event loop, so other requests,
+    RPC calls and UI updates don't stall while a page is parsed. `kind` is
+    'thread', 'process' (parsing scales across cores) or 'none' to parse on
+    the event loop.
+    """
+
+    def __init__(self, kind=None, size=None, timeout=None):
+        self.kind = cfg.PARSE_POOL if kind is None else kind
+        self.size = cfg.PARSE_POOL_SIZE if size is None else size
+        self.timeout = cfg.PARSE_TIMEOUT if timeout is None else timeout
+
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.kind == 'process':
+                # Spawn, forking a process running the UI and event loop
+                # threads isn't safe.
+                self._executor = ProcessPoolExecutor(
+                    self.size or None,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_parse_worker,
+                    initargs=(cfg.CFG_ENGINES_FILE, cfg.HTML_PARSER)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.size or None, thread_name_prefix='tordl-parse'
+                )
+        return self._executor
+
+    async def run(self, dl, method, response):
+        """
+        Call `method` (name) of engine `dl` with `response`, raises
+        asyncio.TimeoutError when parsing takes more than `timeout` seconds.
+        The timeout only bounds the wait of the caller, a parse running in
+        a worker thread or process can't be stopped, it keeps its worker
+        busy until it's done.
+        """
+        if self.kind == 'none':
+            return getattr(dl, method)(response)
+
+        if self.kind == 'process':
+            fn = partial(_parse_in_worker, type(dl), method)
+        else:
+            fn = getattr(dl, method)
+
+        return await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, fn, response
+            ),
+            self.timeout or None
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
 class BaseDl(object):
     NAME = ''
     BASE_URL = None
     SEARCH_URL = None
     INDEXED = True
+    # Seconds to keep responses in the HTTP cache, None for the config default.
+    CACHE_TTL = None
+    # SoupStrainers limiting parsing of search and magnet link pages to the
+    # elements engine actually reads, None parses the whole page.
+    SEARCH_SCOPE = None
+    MAGNET_SCOPE = None
+    # URL requested to check the site is up again, BASE_URL by default.
+    PROBE_URL = None
+    # Other base URLs of the site, requests are sent to the fastest healthy
+    # one of BASE_URL and MIRRORS (see MirrorTable).
+    MIRRORS = ()
 
-    def __init__(self):
-        self._current_index = 1
-        self._current_search = None
+    def __init__(
+            self, http_client=None, parse_pool=None, health=None, mirrors=None
+    ):
         self._headers = self._create_headers()
+        self._http_client = http_client
+        self._parse_pool = parse_pool
+        self._health = health
+        self._mirrors = mirrors
+        self._mirror_lock = None
 
-    async def search(self, expression):
-        if expression is None:
-            if not self.INDEXED:
-                return []
+    @property
+    def http_client(self):
+        return self._http_client
 
-            self._current_index += 1
-        else:
-            self._current_index = 1
+    @http_client.setter
+    def http_client(self, http_client):
+        self._http_client = http_client
 
-        if expression:
-            self._current_search = expression
+    @property
+    def parse_pool(self):
+        return self._parse_pool
 
-        self._set_referer('%s/' % self.BASE_URL)
-        response = await self._get_url(
-            self._mk_search_url(self._current_search)
-        )
+    @parse_pool.setter
+    def parse_pool(self, parse_pool):
+        self._parse_pool = parse_pool
+
+    @property
+    def health(self):
+        return self._health
 
-        return self._process_search(response) if response else None
+    @health.setter
+    def health(self, health):
+        self._health = health
+
+    @property
+    def mirrors(self):
+        return self._mirrors
+
+    @mirrors.setter
+    def mirrors(self, mirrors):
+        self._mirrors = mirrors
+
+    async def search(self, expression, page=1):
+        """
+        Search results on page number `page` (from 1) of search `expression`.
+        """
+        if page > 1 and not self.INDEXED:
+            return []
+
+        url = self._search_url(expression, page)
+        response = await self._get_url(url, referer='%s/' % self.BASE_URL)
+        if not response:
+            return None
+
+        search_results = await self._parse('_process_search', response)
+        for r in search_results or ():
+            r.referer = url
+        return search_results
 
     async def get_magnet_url(self, search_result):
-        self._set_referer(self._mk_search_url(self._current_search))
         response = await self._get_url(
-            self._mk_magnet_url(search_result.links[0])
+            self._mk_magnet_url(search_result.links[0]),
+            referer=search_result.referer or '%s/' % self.BASE_URL
         )
         return await self._process_magnet_link(response) if response else None
 
-    async def _get_url(self, url):
+    async def probe(self):
+        """
+        Check if the site is up (bypassing the HTTP cache), used to close an
+        open circuit of the engine.
+        """
+        return await self._get_url(
+            self.PROBE_URL or '%s/' % self.BASE_URL, use_cache=False
+        ) is not None
+
+    async def _get_url(self, url, use_cache=True, referer=None):
+        # Engines created outside of DlFacade don't share a session, use
+        # a short-lived one.
+        http_client = self._http_client or HttpClient()
+        attempt = 0
         try:
-            async with ClientSession(
-                    headers=self._headers,
-                    timeout=ClientTimeout(cfg.REQUEST_TIMEOUT)
-            ) as sess:
-                async with sess.get(
-                        url, timeout=cfg.REQUEST_TIMEOUT
-                ) as response:
-                    return await response.read()
-        except asyncio.exceptions.TimeoutError:
+            while True:
+                try:
+                    response = await self._fetch(
+                        http_client, url, use_cache, referer
+                    )
+                    break
+                except Exception as e:
+                    # This should handle "aiohttp.client_exceptions.
+                    # ClientConnectionError", SSL Errors, ConnectionResetError
+                    # and basically all kind of errors happening on an HTTP
+                    # connection. Some Torrent Sites we scrape might close
+                    # a connection due to too many requests and so on. It's
+                    # better to just die silently than break the ncurses window
+                    # and basically 'break' the whole app. Transient errors are
+                    # retried first, the error is still recorded in the engine
+                    # health.
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        self._on_request_failed(e, self._base_url())
+                        return None
+
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            if http_client is not self._http_client:
+                await http_client.close()
+
+        # The latency is recorded by _on_response, excluding the time spent
+        # waiting for the rate limiter and retries.
+        if self._health is not None:
+            self._health.success()
+        if self._uses_mirrors():
+            self._mirrors.success(self._base_url())
+        return response
+
+    async def _fetch(self, http_client, url, use_cache=True, referer=None):
+        if self._needs_mirror():
+            base_url, response = await self._select_mirror(
+                http_client, url, referer
+            )
+            if response is not None:
+                return response
+        else:
+            base_url = self._base_url()
+
+        return await self._hedged_request(
+            http_client, base_url, url, use_cache, referer
+        )
+
+    def _retry_delay(self, error, attempt):
+        """
+        Backoff before retrying a request failed with `error`, None when the
+        error isn't transient or there are no retries left (RETRY_MAX per
+        request, the retry budget of the search). A timed out request is only
+        retried when the search deadline leaves time for another timeout.
+        """
+        if attempt >= cfg.RETRY_MAX or not is_retryable(error):
             return None
-        except Exception:
-            # This should handle "aiohttp.client_exceptions.
-            # ClientConnectionError", SSL Errors, ConnectionResetError and
-            # basically all kind of errors happening on an HTTP connection. Some
-            # Torrent Sites we scrape might close a connection due to too many
-            # requests and so on. It's better to just die silently than break
-            # the ncurses window and basically 'break' the whole app.
+
+        delay = backoff(attempt)
+        budget = current_budget.get()
+        if isinstance(error, asyncio.TimeoutError):
+            remaining = budget.remaining if budget is not None else None
+            timeout = self._timeout() or cfg.REQUEST_TIMEOUT
+            if remaining is None or remaining <= delay + timeout:
+                return None
+        if budget is not None and not budget.take(delay):
             return None
 
-    def _mk_search_url(self, expression):
+        if self._health is not None:
+            self._health.retries += 1
+        return delay
+
+    async def _request(
+            self, http_client, base_url, url, use_cache=True, referer=None
+    ):
+        return await http_client.get(
+            self._rewrite_url(url, base_url),
+            self._request_headers(base_url, referer),
+            timeout=self._timeout(),
+            cache_name=self.NAME,
+            cache_ttl=self._cache_ttl() if use_cache else 0,
+            decode=True,
+            on_response=self._on_response,
+            rate_key=self._rate_key()
+        )
+
+    async def _hedged_request(
+            self, http_client, base_url, url, use_cache=True, referer=None
+    ):
+        """
+        Send the request again when there's no response after HEDGE_PERCENTILE
+        of the engine's latencies and take whichever response comes first.
+        """
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._request(
+                http_client, base_url, url, use_cache, referer
+            )
+
+        first = asyncio.ensure_future(
+            self._request(http_client, base_url, url, use_cache, referer)
+        )
+        try:
+            done, _ = await asyncio.wait((first,), timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        if http_client.rate_limiter.busy(
+                self._rewrite_url(url, base_url), self._rate_key()
+        ):
+            # Requests to the host are queued already, a duplicate would only
+            # make the queue longer.
+            return await first
+
+        self._health.hedged += 1
+        second = asyncio.ensure_future(
+            self._request(http_client, base_url, url, use_cache, referer)
+        )
+        task = await first_success((first, second))
+        if task is second:
+            self._health.hedge_wins += 1
+        return task.result()
+
+    def _on_response(self, status, elapsed):
+        if self._health is not None:
+            self._health.observe(elapsed)
+
+    def _rate_key(self):
+        """
+        Rate limiter bucket of the engine's requests, None for the host of the
+        request. Engines pointed elsewhere (all engines share the host of a
+        replay server) get a bucket of their own.
+        """
+        if self.NAME in cfg.BASE_URL_OVERRIDE or cfg.REPLAY_URL:
+            return self.NAME
+        return None
+
+    def _timeout(self):
+        """
+        Request timeout adapted to the engine's latencies (see config
+        ADAPTIVE_TIMEOUT), None for REQUEST_TIMEOUT. Timed out requests aren't
+        latency samples, a timeout would only make the next one longer.
+        """
+        if not cfg.ADAPTIVE_TIMEOUT or self._health is None:
+            return None
+
+        latency = self._health.latencies.percentile(99)
+        if latency is None:
+            return None
+        return min(
+            max(
+                latency * cfg.ADAPTIVE_TIMEOUT_FACTOR,
+                cfg.ADAPTIVE_TIMEOUT_MIN
+            ),
+            cfg.ADAPTIVE_TIMEOUT_MAX or cfg.REQUEST_TIMEOUT
+        )
+
+    def _hedge_delay(self):
+        if not cfg.HEDGE_REQUESTS or self._health is None:
+            return None
+
+        delay = self._health.latencies.percentile(cfg.HEDGE_PERCENTILE)
+        timeout = self._timeout() or cfg.REQUEST_TIMEOUT
+        if delay is None or delay >= timeout:
+            return None
+        return delay
+
+    def _on_request_failed(self, error, base_url=None):
+        if self._health is not None:
+            self._health.failure(error)
+        if base_url and self._uses_mirrors():
+            self._mirrors.failure(self.NAME, base_url)
+
+    def _uses_mirrors(self):
+        return bool(self.MIRRORS) and self._mirrors is not None and \
+            self.NAME not in cfg.BASE_URL_OVERRIDE and not cfg.REPLAY_URL
+
+    def _mirror_urls(self):
+        return [self.BASE_URL] + list(self.MIRRORS)
+
+    def _chosen_mirror(self):
+        chosen = self._mirrors.chosen(self.NAME)
+        return chosen if chosen in self._mirror_urls() else None
+
+    def _needs_mirror(self):
+        return self._uses_mirrors() and self._chosen_mirror() is None and \
+            self._mirrors.can_measure(self.NAME)
+
+    async def _select_mirror(self, http_client, url, referer=None):
+        """
+        Choose the mirror for requests of this engine, return it with the
+        response to `url` when the request was raced (see config MIRROR_RACE),
+        otherwise with None. While mirrors which all failed are backed off,
+        BASE_URL is used without measuring them again.
+        """
+        if self._mirror_lock is None:
+            self._mirror_lock = Lock()
+
+        async with self._mirror_lock:
+            # Chosen or failed while waiting for the lock.
+            base_url = self._chosen_mirror()
+            if base_url is not None:
+                return base_url, None
+            if not self._mirrors.can_measure(self.NAME):
+                return self.BASE_URL, None
+            if cfg.MIRROR_RACE:
+                return await self._race_mirrors(http_client, url, referer)
+            return await self._measure_mirrors(http_client), None
+
+    async def _measure_mirrors(self, http_client):
+        """
+        Time the front page of every mirror, choose the fastest one. When all
+        of them fail, BASE_URL is returned and the failure is remembered.
+        """
+        urls = self._mirror_urls()
+        ok = await asyncio.gather(
+            *(self._time_mirror(http_client, base_url) for base_url in urls)
+        )
+        alive = [base_url for base_url, o in zip(urls, ok) if o]
+        if not alive:
+            self._mirrors.measurement_failed(self.NAME)
+            return self.BASE_URL
+
+        base_url = self._mirrors.rank(alive)[0]
+        self._mirrors.choose(self.NAME, base_url)
+        return base_url
+
+    async def _time_mirror(self, http_client, base_url):
+        started = time.monotonic()
+        try:
+            await self._request(
+                http_client,
+                base_url,
+                self.PROBE_URL or '%s/' % self.BASE_URL,
+                use_cache=False
+            )
+        except Exception:
+            self._mirrors.failure(self.NAME, base_url)
+            return False
+
+        self._mirrors.success(base_url, time.monotonic() - started)
+        return True
+
+    async def _race_mirrors(self, http_client, url, referer=None):
+        """
+        Send the request to the two most promising mirrors, choose the one
+        which responds first and cancel the other request.
+        """
+        started = time.monotonic()
+        tasks = {
+            asyncio.ensure_future(
+                # Not cached, a cached response would win every race.
+                self._request(
+                    http_client, base_url, url, use_cache=False, referer=referer
+                )
+            ): base_url
+            for base_url in self._mirrors.rank(self._mirror_urls())[:2]
+        }
+        try:
+            task = await first_success(
+                tasks, lambda t: self._mirrors.failure(self.NAME, tasks[t])
+            )
+        except Exception:
+            self._mirrors.measurement_failed(self.NAME)
+            raise
+
+        base_url = tasks[task]
+        self._mirrors.success(base_url, time.monotonic() - started)
+        self._mirrors.choose(self.NAME, base_url)
+        return base_url, task.result()
+
+    def _mk_search_url(self, expression, page):
         raise NotImplementedError()
 
+    def _search_url(self, expression, page):
+        if len(inspect.signature(self._mk_search_url).parameters) < 2:
+            # Engine definitions copied to the config directory by a version
+            # without explicit page numbers (until they're updated with
+            # setup.sh -i).
+            self._current_index = page
+            return self._mk_search_url(expression)
+        return self._mk_search_url(expression, page)
+
+    async def _parse(self, method, response):
+        if self._parse_pool is None:
+            return getattr(self, method)(response)
+
+        try:
+            return await self._parse_pool.run(self, method, response)
+        except asyncio.TimeoutError:
+            return None
+
     def _process_search(self, response):
         raise NotImplementedError()
 
@@ -156,21 +1147,83 @@ class BaseDl(object):
         pass
 
     async def _process_magnet_link(self, response):
+        return await self._parse('_parse_magnet_page', response)
+
+    def _parse_magnet_page(self, response):
         pass
 
-    @staticmethod
-    async def _fetch_torrent_file(url):
-        async with ClientSession() as sess:
-            async with sess.get(url) as response:
-                a = await response.read()
-                fd, fp = tempfile.mkstemp()
+    async def _fetch_torrent_file(self, url):
+        """
+        Download the torrent file and return its magnet link, the torrent file
+        is only parsed in memory.
+        """
+        http_client = self._http_client or HttpClient()
+        base_url = self._base_url()
+        try:
+            a = await http_client.get(
+                self._rewrite_url(url, base_url),
+                self._request_headers(base_url),
+                timeout=self._timeout(),
+                on_response=self._on_response,
+                rate_key=self._rate_key()
+            )
+        finally:
+            if http_client is not self._http_client:
+                await http_client.close()
 
-                with os.fdopen(fd, 'wb') as f:
-                    f.write(a)
+        return torrent_to_magnet(a)
+
+    def _mk_soup(self, response, parse_only=None):
+        return BeautifulSoup(
+            response,
+            features=get_html_parser(cfg.HTML_PARSER),
+            parse_only=parse_only
+        )
 
-                return fp
+    def _cache_ttl(self):
+        if self.NAME in cfg.HTTP_CACHE_ENGINE_TTL:
+            return cfg.HTTP_CACHE_ENGINE_TTL[self.NAME]
+        if self.CACHE_TTL is not None:
+            return self.CACHE_TTL
+        return cfg.HTTP_CACHE_TTL
+
+    def _base_url(self):
+        """
+        Base URL requests are really sent to, the chosen mirror or BASE_URL
+        unless it's overridden in config (e.g. to point engines at a replay
+        server).
+        """
+        if self.NAME in cfg.BASE_URL_OVERRIDE:
+            return cfg.BASE_URL_OVERRIDE[self.NAME].rstrip('/')
+        if cfg.REPLAY_URL:
+            return '%s/%s' % (cfg.REPLAY_URL.rstrip('/'), self.NAME)
+        if self._uses_mirrors():
+            return self._chosen_mirror() or self.BASE_URL
+        return self.BASE_URL
+
+    def _rewrite_url(self, url, base_url=None):
+        base_url = base_url or self._base_url()
+        if base_url != self.BASE_URL and url.startswith(self.BASE_URL):
+            return base_url + url[len(self.BASE_URL):]
+        return url
+
+    def _request_headers(self, base_url, referer=None):
+        """
+        Request headers with Host and Origin of `base_url` and `referer`.
+        Engines are shared by concurrent searches, so the headers are built
+        for every request instead of being changed on the engine.
+        """
+        headers = dict(self._headers)
+        split_url = urlsplit(base_url)
+        if split_url.netloc != headers['Host']:
+            headers['Host'] = split_url.netloc
+            headers['Origin'] = '%s://%s' % (split_url.scheme, split_url.netloc)
+        if referer:
+            headers['Referer'] = self._rewrite_url(referer, base_url)
+        return headers
 
     def _create_headers(self):
+        base_url = urlsplit(self.BASE_URL)
         return {
             'Accept': 'text/html,application/xhtml+xml,'
                       'application/xml;q=0.9,image/webp,'
@@ -179,8 +1232,8 @@ class BaseDl(object):
             'Accept-Language': 'en-US,en;q=0.5',
             'Connection': 'keep-alive',
             'Content-Type': 'application/x-www-form-urlencoded',
-            'Host': self.BASE_URL.split('://')[1],
-            'Origin': self.BASE_URL,
+            'Host': base_url.netloc,
+            'Origin': '%s://%s' % (base_url.scheme, base_url.netloc),
             'Set-GPC': '1',
             'Upgrade-Insecure-Requests': '1',
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64;'
@@ -189,9 +1242,6 @@ class BaseDl(object):
                           'Safari/537.36'
         }
 
-    def _set_referer(self, url):
-        self._headers['Referer'] = url
-
     @staticmethod
     def _parse_k_string(s):
         s = s.strip()
@@ -203,30 +1253,30 @@ class BaseDl(object):
 
 
 class DlFacade(object):
-    class GetMagnetUrlTask(Task):
-        def __init__(self, loop, coro, search_result, search_progress):
-            super().__init__(coro, loop=loop)
-            self.search_result = search_result
-            self.search_progress = search_progress
-
     def __init__(
             self,
             loop,
             dl_classes=None,
+            http_client=None,
+            parse_pool=None
     ):
         self._loop = loop
+        self._http_client = http_client or HttpClient(
+            cache=HttpCache() if cfg.USE_HTTP_CACHE else None,
+            cassette=Cassette.mk()
+        )
+        self._parse_pool = parse_pool or ParsePool()
+        self._health = HealthBoard(self._on_circuit_open)
+        self._probes = {}
+        self._mirrors = MirrorTable()
+        self._magnet_cache = MagnetCache() if cfg.USE_MAGNET_CACHE else None
         if dl_classes:
-            self._engines = {c: c() for c in dl_classes}
+            self._engines = {c: self.mk_engine(c) for c in dl_classes}
             self._all_engines = self._load_engines()[1]
         else:
             self._engines, self._all_engines = self._load_engines()
 
-        self._ml_fetch_counter = 0
-        self._no_magnet_links = None
-        self._mls_fetched = Event()
-        self._ml_fetch_tasks = None
-
-        self._last_exclude = None
+        self._scheduler = FetchScheduler()
 
     @property
     def engines(self):
@@ -236,158 +1286,374 @@ class DlFacade(object):
     def all_engines(self):
         return self._all_engines
 
-    async def search(self, expression, search_progress=None):
-        if cfg.USE_EXCLUDE_SEARCH:
-            if expression:
-                a = [
-                    e.strip(' ') for e in
-                    expression.split(cfg.EXCLUDE_SEARCH_DELIMITER)
-                ]
-                expression = a[0]
-                self._last_exclude = a[1:]
-        else:
-            self._last_exclude = None
+    @property
+    def http_client(self):
+        return self._http_client
 
-        coros = []
-        for dl in self._engines.values():
-            coros.append(dl.search(expression))
+    @property
+    def parse_pool(self):
+        return self._parse_pool
 
-        if search_progress and search_progress.max_ == 1:
-            search_progress.max_ = len(self._engines.items())
+    @property
+    def health(self):
+        return self._health
 
-        results = await self._wait_with_progress(coros, search_progress)
-        result = []
+    @property
+    def mirrors(self):
+        return self._mirrors
 
-        for res in results:
-            res = res.result()
-            if res:
-                if self._last_exclude:
-                    result_excluded = []
-                    for r in res:
-                        excluded = False
-                        for e in self._last_exclude:
-                            if e in r.name:
-                                excluded = True
-                                break
-                        if not excluded:
-                            result_excluded.append(r)
-
-                    result.extend(result_excluded)
-                else:
-                    result.extend(res)
+    @property
+    def magnet_cache(self):
+        return self._magnet_cache
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    def mk_engine(self, dl_class):
+        return dl_class(
+            self._http_client,
+            self._parse_pool,
+            self._health[dl_class.NAME],
+            self._mirrors
+        )
+
+    async def close(self):
+        for probe in self._probes.values():
+            probe.cancel()
+        await self._http_client.close()
+        self._parse_pool.close()
+        if self._magnet_cache is not None:
+            self._magnet_cache.close()
+
+    async def search(self, search_term, search_progress=None):
+        result = []
+        async for res in self.search_iter(search_term, search_progress):
+            result.extend(res)
 
         return result
 
-    async def fetch_pages(self, search_term, search_progress=None):
-        coros = []
-        if search_progress:
-            search_progress.max_ = \
-                len(self._engines.items()) * cfg.PAGE_NUM_DOWNLOAD
+    async def search_iter(self, search_term, search_progress=None):
+        """
+        Yield search results of every engine as soon as the engine responds.
+        `search_term` is a search expression or a SearchCursor, for the next
+        page of its search.
+        """
+        cursor = SearchCursor.mk(search_term)
+        page = cursor.take_pages(1)[0]
+        engines = [
+            dl for dl in self._available_engines()[0]
+            if dl.NAME not in cursor.exhausted
+        ]
 
-        for i in range(cfg.PAGE_NUM_DOWNLOAD):
-            coros.append(
-                self.search(search_term if i == 0 else None, search_progress)
-            )
+        if search_progress and search_progress.max_ == 1:
+            search_progress.max_ = len(engines)
+
+        budget = RetryBudget()
+        async for res in self._iter_results(
+                [
+                    (
+                        dl,
+                        page,
+                        with_budget(budget, dl.search(cursor.expression, page))
+                    )
+                    for dl in engines
+                ],
+                search_progress,
+                cursor=cursor
+        ):
+            yield res
+
+    async def fetch_pages(
+            self, search_term, search_progress=None, deadline=None
+    ):
+        deadline = Deadline.mk(deadline)
+        items = SearchResults()
+        async for result in self.fetch_pages_iter(
+                search_term, search_progress, deadline=deadline
+        ):
+            items.extend(result)
+
+        return deadline.apply(items)
 
-        done = await self._wait_with_progress(coros)
+    async def fetch_pages_iter(
+            self,
+            search_term,
+            search_progress=None,
+            aggregate=False,
+            aggregate_with=None,
+            fetch_magnet_links=False,
+            concurrent=20,
+            deadline=None,
+            top_k=None,
+            sort_key=None
+    ):
+        """
+        Yield batches of search results (one engine page each) as they arrive.
+        `search_term` is a search expression or a SearchCursor, to fetch more
+        results of its search. PAGE_NUM_DOWNLOAD pages of every engine are
+        fetched in parallel. With `fetch_magnet_links` the missing magnet
+        links of a batch are fetched before it is yielded, with `top_k` only
+        of results among the best K (by `sort_key`) seen so far in the search.
+        With `aggregate` only results with a
+        magnet link not seen before (in this search or in `aggregate_with`,
+        a MagnetIndex or a list of results) are yielded, the others are merged
+        into the already yielded ones.
+        When the `deadline` expires, search engines which haven't responded
+        yet are cancelled and recorded in the deadline, search engines skipped
+        because of an open circuit are recorded as skipped.
+        """
+        deadline = Deadline.mk(deadline)
+        engines, skipped = self._available_engines()
+        if skipped:
+            deadline.skip(skipped)
+
+        cursor = SearchCursor.mk(search_term)
+        pages = cursor.take_pages(cfg.PAGE_NUM_DOWNLOAD)
+        # Skip engines without more pages or pagination at all.
+        engines = [
+            dl for dl in engines
+            if dl.NAME not in cursor.exhausted and
+            (dl.INDEXED or pages[0] == 1)
+        ]
+
+        if search_progress:
+            search_progress.max_ = len(engines) * len(pages)
+
+        budget = RetryBudget(deadline=deadline)
+        coros = []
+        for page in pages:
+            for dl in engines:
+                coros.append(
+                    (
+                        dl,
+                        page,
+                        with_budget(budget, dl.search(cursor.expression, page))
+                    )
+                )
 
-        items = []
-        for t in done:
-            result = t.result()
+        if isinstance(aggregate_with, MagnetIndex):
+            index = aggregate_with
+        else:
+            index = MagnetIndex(aggregate_with)
+        best = []
+        async for result in self._iter_results(
+                coros, search_progress, deadline, cursor
+        ):
+            if fetch_magnet_links:
+                await self.fetch_magnet_links(
+                    self._take_best(best, result, top_k, sort_key)
+                    if top_k else result,
+                    concurrent,
+                    deadline=deadline,
+                    retry_budget=budget
+                )
+            if aggregate:
+                result = index.merge(result)
             if result:
-                items.extend(result)
+                yield result
 
-        return items
+    @staticmethod
+    def _take_best(best, search_results, top_k, sort_key=None):
+        """
+        Those of `search_results` among the best `top_k` results seen so far,
+        `best` is a heap of sort keys of the best results kept between calls.
+        """
+        key = SORT_KEYS[sort_key or cfg.MAGNET_TOP_K_SORT]
+        taken = []
+        for sr in sorted(search_results, key=key, reverse=True):
+            value = key(sr)
+            if len(best) < top_k:
+                heapq.heappush(best, value)
+            elif value > best[0]:
+                heapq.heapreplace(best, value)
+            else:
+                break
+            taken.append(sr)
 
-    def aggregate_same_magnets(self, search_results, new_search_results=None):
-        if not new_search_results:
-            new_search_results = search_results
-
-        for nsr in new_search_results:
-            for sr in search_results:
-                if nsr != sr:
-                    if nsr.magnet_url and sr.magnet_url == nsr.magnet_url:
-                        sr.origins.append(nsr.origins[0])
-                        sr.links.append(nsr.links[0])
-                        if nsr.seeders > sr.seeders:
-                            sr.seeders = nsr.seeders
-                        if nsr.leechers > sr.leechers:
-                            sr.leechers = nsr.leechers
-                        new_search_results.remove(nsr)
+        return taken
 
+    def aggregate_same_magnets(self, search_results, new_search_results=None):
+        """
+        Merge results with the same magnet link. If `new_search_results` are
+        supplied, merge them into `search_results` and return those not merged.
+        """
+        if new_search_results is None:
+            search_results[:] = MagnetIndex().merge(search_results)
+            return search_results
+
+        new_search_results[:] = MagnetIndex(search_results).merge(
+            new_search_results
+        )
         return new_search_results
 
     async def get_magnet_url(self, search_result):
-        e = self._engines[search_result.origins[0]]
-        return await e.get_magnet_url(search_result)
+        magnet_url = self._get_cached_magnet_url(search_result)
+        if magnet_url is None:
+            magnet_url = await self._fetch_magnet_url(search_result)
+
+        return magnet_url
+
+    def _get_cached_magnet_url(self, search_result):
+        magnet_cache = self._magnet_cache_of(search_result.origins[0].NAME)
+        if magnet_cache is None:
+            return None
+
+        return magnet_cache.get(
+            search_result.origins[0].NAME, search_result.links[0]
+        )
+
+    def _magnet_cache_of(self, engine_name):
+        """
+        Magnet cache for links of engine `engine_name`, None when its pages
+        don't come from the site (replay server, BASE_URL_OVERRIDE or
+        a cassette), their magnet links mustn't end up in real searches.
+        """
+        if self._magnet_cache is None or cfg.REPLAY_URL or \
+                engine_name in cfg.BASE_URL_OVERRIDE or \
+                self._http_client.cassette is not None:
+            return None
+        return self._magnet_cache
+
+    async def _fetch_magnet_url(self, search_result, retry_budget=None):
+        cls = search_result.origins[0]
+        e = self._engines.get(cls) or self.mk_engine(cls)
+        coro = e.get_magnet_url(search_result)
+        if retry_budget is not None:
+            # Fetched in a scheduler task, the budget is set for it only.
+            coro = with_budget(retry_budget, coro)
+        magnet_url = await coro
+        # Some engines return just a link to the torrent file, don't cache it.
+        magnet_cache = self._magnet_cache_of(e.NAME)
+        if magnet_cache is not None and magnet_url \
+                and magnet_url.startswith('magnet:'):
+            magnet_cache.put(e.NAME, search_result.links[0], magnet_url)
+
+        return magnet_url
 
     async def fetch_magnet_links(
-            self, search_results, concurrent=20, search_progress=None
+            self,
+            search_results,
+            concurrent=20,
+            search_progress=None,
+            deadline=None,
+            priority=None,
+            top_k=None,
+            sort_key=None,
+            retry_budget=None
     ):
-        if self._no_magnet_links is not None:
-            raise RuntimeError('Magnetlink fetch in progress.')
-
-        self._mls_fetched = Event()
-        self._no_magnet_links = []
-        self._ml_fetch_tasks = []
+        """
+        Fetch missing magnet links of `search_results` through the shared
+        scheduler (`concurrent` sets its global limit), results with the lowest
+        `priority(search_result)` first, by default those with most seeders.
+        With `top_k`, only the best K results by `sort_key` (see SORT_KEYS) are
+        resolved, the rest can be resolved later with get_magnet_url().
+        Retries of the requests are taken from `retry_budget` (RetryBudget).
+        """
+        deadline = Deadline.mk(deadline)
+        if retry_budget is None:
+            retry_budget = RetryBudget(deadline=deadline)
+        if top_k:
+            search_results_k = sorted(
+                search_results,
+                key=SORT_KEYS[sort_key or cfg.MAGNET_TOP_K_SORT],
+                reverse=True
+            )[:top_k]
+        else:
+            search_results_k = search_results
 
-        for sr in search_results:
+        no_magnet_links = []
+        for sr in search_results_k:
             if not sr.magnet_url:
-                self._no_magnet_links.append(sr)
+                sr.magnet_url = self._get_cached_magnet_url(sr)
+            if not sr.magnet_url and \
+                    self._health.available(sr.origins[0].NAME):
+                no_magnet_links.append(sr)
 
-        ln = len(self._no_magnet_links)
-        if ln > 0:
+        if no_magnet_links:
             if search_progress:
-                search_progress.max_ = ln
-            max_ = min(concurrent, ln)
-            self._ml_fetch_counter = max_ - 1
-            for i in range(0, max_):
-                sr = self._no_magnet_links[i]
-                self._create_ml_fetch_task(sr, search_progress)
-
-            await self._mls_fetched.wait()
-
-        self._no_magnet_links = None
+                search_progress.max_ = len(no_magnet_links)
+            if priority is None:
+                priority = self._priority_seeders
+
+            self._scheduler.concurrent = concurrent
+            futures = {}
+            for sr in no_magnet_links:
+                f = self._scheduler.submit(
+                    partial(self._fetch_magnet_url, sr, retry_budget),
+                    urlsplit(sr.origins[0].BASE_URL).netloc,
+                    priority(sr)
+                )
+                f.add_done_callback(
+                    partial(self._on_fetch_magnet_done, sr, search_progress)
+                )
+                futures[f] = sr
 
-        return search_results
+            try:
+                _, pending = await asyncio.wait(
+                    futures.keys(), timeout=deadline.remaining
+                )
+                if pending:
+                    deadline.miss(
+                        futures[f].origins[0].NAME for f in futures
+                        if f in pending
+                    )
+            finally:
+                self._scheduler.cancel(
+                    [f for f in futures.keys() if not f.done()]
+                )
 
-    def _on_fetch_magnet_done(self, task):
-        task.search_result.magnet_url = task.result()
-        task.remove_done_callback(self._on_fetch_magnet_done)
-        self._ml_fetch_tasks.remove(task)
+        return deadline.apply(search_results)
 
-        self._ml_fetch_counter += 1
+    def _available_engines(self):
+        """
+        Return selected engines with a closed circuit and names of the others.
+        """
+        engines = []
+        skipped = []
+        for dl in self._engines.values():
+            if self._health.available(dl.NAME):
+                engines.append(dl)
+            else:
+                skipped.append(dl.NAME)
 
-        if task.search_progress:
-            task.search_progress.progress += 1
+        return engines, skipped
 
-        if self._ml_fetch_counter < len(self._no_magnet_links):
-            self._create_ml_fetch_task(
-                self._no_magnet_links[self._ml_fetch_counter],
-                task.search_progress
+    def _on_circuit_open(self, health):
+        probe = self._probes.get(health.name)
+        if probe is None or probe.done():
+            self._probes[health.name] = asyncio.ensure_future(
+                self._probe(health)
             )
 
-        if len(self._ml_fetch_tasks) == 0:
-            self._mls_fetched.set()
+    async def _probe(self, health):
+        dl = self._find_engine(health.name)
+        while health.state == health.OPEN:
+            await asyncio.sleep(health.cool_down)
+            health.half_open()
+            await dl.probe()
 
-    def _create_ml_fetch_task(self, search_result, search_progress=None):
-        task = self.GetMagnetUrlTask(
-            self._loop,
-            self.get_magnet_url(search_result),
-            search_result,
-            search_progress
-        )
-        task.add_done_callback(self._on_fetch_magnet_done)
-        self._ml_fetch_tasks.append(task)
+    def _find_engine(self, name):
+        for dl in self._engines.values():
+            if dl.NAME == name:
+                return dl
+        for cls in self._all_engines:
+            if cls.NAME == name:
+                return self.mk_engine(cls)
 
     @staticmethod
-    def _load_engines():
-        loader = importlib.machinery.SourceFileLoader(
-            'engines_mod', cfg.CFG_ENGINES_FILE
-        )
-        spec = importlib.util.spec_from_loader('engines_mod', loader)
-        engines_mod = importlib.util.module_from_spec(spec)
-        loader.exec_module(engines_mod)
+    def _on_fetch_magnet_done(search_result, search_progress, future):
+        if not future.cancelled() and future.exception() is None:
+            search_result.magnet_url = future.result()
+        if search_progress:
+            search_progress.progress += 1
+
+    @staticmethod
+    def _priority_seeders(search_result):
+        return -search_result.seeders
+
+    def _load_engines(self):
+        engines_mod = load_engines_module()
 
         all_engines = []
         for name, obj in inspect.getmembers(engines_mod):
@@ -399,31 +1665,96 @@ class DlFacade(object):
         engines = {}
         for c in all_engines:
             if c.NAME in cfg.SEARCH_ENGINES:
-                engines[c] = c()
+                engines[c] = self.mk_engine(c)
 
         if not engines:
             raise RuntimeError("No search engines selected.")
 
         return engines, all_engines
 
+    async def _iter_results(
+            self, coros, search_progress=None, deadline=None, cursor=None
+    ):
+        """
+        Run `coros` ((engine, page number, coroutine) tuples) concurrently and
+        yield their results (without those excluded by the `cursor`), pages of
+        an engine in their order. Pages following an empty page or a page
+        repeating the previous one are cancelled and the engine is recorded
+        as exhausted in the `cursor`.
+        """
+        cursor = cursor or SearchCursor(None)
+        tasks = {
+            asyncio.create_task(cor): (dl, page) for dl, page, cor in coros
+        }
+        next_pages = {}
+        for dl, page in tasks.values():
+            next_pages[dl] = min(page, next_pages.get(dl, page))
+        arrived = {}
+        last_pages = {}
+        stopped = set()
+
+        pending = set(tasks.keys())
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=deadline.remaining if deadline else None,
+                    return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    deadline.miss(tasks[t][0].NAME for t in pending)
+                    # Don't hold back pages waiting for the missed ones.
+                    for dl, page in sorted(
+                            arrived, key=lambda k: (k[0].NAME, k[1])
+                    ):
+                        res = cursor.filter_excluded(arrived[dl, page] or [])
+                        if res:
+                            yield res
+                    break
+
+                for t in done:
+                    if search_progress:
+                        search_progress.progress += 1
+                    dl, page = tasks[t]
+                    if t.cancelled() or dl in stopped:
+                        continue
+
+                    arrived[dl, page] = t.result()
+                    while (dl, next_pages[dl]) in arrived:
+                        res = arrived.pop((dl, next_pages[dl]))
+                        next_pages[dl] += 1
+                        if res is None:
+                            # Request failed, the next page may still be ok.
+                            continue
+
+                        key = self._page_key(res)
+                        if not res or key == last_pages.get(dl):
+                            self._stop_engine(dl, tasks, arrived)
+                            stopped.add(dl)
+                            cursor.exhausted.add(dl.NAME)
+                            break
+
+                        last_pages[dl] = key
+                        res = cursor.filter_excluded(res)
+                        if res:
+                            yield res
+        finally:
+            for t in tasks:
+                t.cancel()
+
     @staticmethod
-    async def _wait_with_progress(coros, search_progress=None):
-        done, pending = await asyncio.wait(
-            [asyncio.create_task(cor) for cor in coros], return_when=FIRST_COMPLETED
+    def _page_key(search_results):
+        return frozenset(
+            r.links[0] if r.links else r.magnet_url for r in search_results
         )
-        done = list(done)
-        if search_progress:
-            search_progress.progress += len(done)
-
-        while pending:
-            done_, pending = await asyncio.wait(
-                pending, return_when=FIRST_COMPLETED
-            )
-            done.extend(done_)
-            if search_progress:
-                search_progress.progress += len(done_)
 
-        return done
+    @staticmethod
+    def _stop_engine(dl, tasks, arrived):
+        for t, (d, _) in tasks.items():
+            if d is dl:
+                t.cancel()
+        for k in [k for k in arrived if k[0] is dl]:
+            del arrived[k]
 
 
 class SearchEngineTest(object):
@@ -441,15 +1772,16 @@ class SearchEngineTest(object):
 
     def __init__(self, test_all=True, term=None, loop=None):
         self._loop = loop or asyncio.get_event_loop()
+        self._dl = DlFacade(self._loop)
         self._engines = self._mk_engines(test_all, term)
 
         self._test_results = []
         self._lock = Lock()
 
     def _mk_engines(self, test_all, term):
-        dl = DlFacade(self._loop)
+        dl = self._dl
         if test_all:
-            engines = [e() for e in dl.all_engines]
+            engines = [dl.mk_engine(e) for e in dl.all_engines]
         else:
             engines = list(dl.engines.values())
 
@@ -515,16 +1847,26 @@ class SearchEngineTest(object):
                     test.messages.append('  - ERROR: MagnetURL not found !')
         else:
             test.error = True
+            health = test.engine.health
+            if health is not None and health.last_error:
+                test.messages.append('  - ERROR: %s' % health.last_error)
             test.messages.append('  - ERROR, no results found !')
 
         t = time.time() - time_start
+        health = test.engine.health
+        retries = health.retries if health is not None else 0
         if not test.error:
             self._test_results.append(
-                '[OK] %s [search_time=%.3fs]' % (test.engine.NAME, t)
+                '[OK] %s [search_time=%.3fs, retries=%d]' % (
+                    test.engine.NAME, t, retries
+                )
             )
         else:
             self._test_results.append(
-                '[ERR] %s [search_time=%.3fs]' % (test.engine.NAME, t))
+                '[ERR] %s [search_time=%.3fs, retries=%d]' % (
+                    test.engine.NAME, t, retries
+                )
+            )
 
         await self._lock.acquire()
         for m in test.messages:
@@ -550,6 +1892,7 @@ class SearchEngineTest(object):
 
         print()
         await asyncio.wait(tasks)
+        await self._dl.close()
         print()
 
         ln = max((len(t) for t in self._test_results))
@@ -558,8 +1901,14 @@ class SearchEngineTest(object):
             print(m)
         print('-' * ln)
 
+        print()
+        print(self._dl.health.format())
+
 
 class Api(object):
+    # Search cursors kept for continuing searches (see `cursor` in results).
+    MAX_CURSORS = 1000
+
     def __init__(
             self,
             dl_classes=None,
@@ -567,37 +1916,339 @@ class Api(object):
             aggregate_same_magnet_links=True,
             concurrent=20,
             search_progress=None,
-            pretty_output=False
+            pretty_output=False,
+            deadline=None,
+            magnet_top_k=None,
+            magnet_top_k_sort=None,
+            json_strings=False
     ):
+        """
+        Search results are returned as plain objects, or (with
+        `json_strings`) already serialized to JSON.
+        """
         self._fetch_missing_magnet_links = fetch_missing_magnet_links
         self._aggregate_same_magnet_links = aggregate_same_magnet_links
         self._concurrent = concurrent
         self._search_progress = search_progress
         self._pretty_output = pretty_output
-
-        self._dl = DlFacade(dl_classes)
+        self._deadline = deadline
+        self._magnet_top_k = cfg.MAGNET_TOP_K \
+            if magnet_top_k is None else magnet_top_k
+        self._magnet_top_k_sort = magnet_top_k_sort or cfg.MAGNET_TOP_K_SORT
+        self._json_strings = json_strings
+
+        self._dl = DlFacade(None, dl_classes)
+        self._cursors = OrderedDict()
+        self._flights = SingleFlight()
+        self._results = ResultCache() if cfg.RESULT_CACHE_SIZE else None
+        self._revalidations = {}
+        # Searches running at once, shared by all callers.
+        self._search_slots = asyncio.Semaphore(cfg.SEARCH_CONCURRENCY) \
+            if cfg.SEARCH_CONCURRENCY else None
 
     async def fetch_with_magnet_links(
             self,
-            search_term
+            search_term,
+            deadline=None,
+            magnet_top_k=None,
+            magnet_top_k_sort=None,
+            cursor=None,
+            cache_control=None
+    ):
+        """
+        Search `search_term`, or fetch the next pages of the search of
+        `cursor` (id of a cursor returned with previous results). Concurrent
+        calls of the same search share one search (and its results), every
+        caller gets a cursor of its own.
+
+        Results of searches are cached, a stale result is returned right away
+        and refreshed in the background. `cache_control` `no-cache` skips
+        the cached result, `max-age=N` takes only a result not older than N
+        seconds.
+        """
+        deadline = self._deadline if deadline is None else deadline
+        top_k = self._magnet_top_k if magnet_top_k is None else magnet_top_k
+        sort_key = magnet_top_k_sort or self._magnet_top_k_sort
+
+        if cursor is not None:
+            # Every call continuing a search fetches its own next pages.
+            cursor = self._mk_cursor(search_term, cursor)
+            search_results, _ = await self._search(
+                cursor, deadline, top_k, sort_key
+            )
+        else:
+            cursor = SearchCursor(search_term)
+            key = self._mk_flight_key(cursor, deadline, top_k, sort_key)
+            search = partial(
+                self._cached_search, key, cursor, deadline, top_k, sort_key
+            )
+
+            cached, stale = self._get_cached(key, cache_control)
+            if cached is None:
+                cached, shared = await self._flights.do(key, search)
+            else:
+                shared = True
+                if stale:
+                    self._revalidate(key, search)
+
+            # `searched` is a copy of the cursor right after the search, the
+            # cursor of the first caller may have moved on already.
+            search_results, searched = cached
+            cursor = self._keep_cursor(searched.fork() if shared else cursor)
+
+        return self._mk_output(search_results, cursor)
+
+    async def search_many(
+            self,
+            search_terms,
+            deadline=None,
+            magnet_top_k=None,
+            magnet_top_k_sort=None,
+            cache_control=None
+    ):
+        """
+        Search all `search_terms` (a list of at most SEARCH_MANY_MAX_TERMS
+        strings) concurrently, at most SEARCH_CONCURRENCY searches at once.
+        Return the result or error and time taken of every search term, in
+        their order.
+        """
+        if not isinstance(search_terms, (list, tuple)) or \
+                not all(isinstance(t, str) for t in search_terms):
+            raise ValueError('Search terms must be a list of strings')
+        if cfg.SEARCH_MANY_MAX_TERMS and \
+                len(search_terms) > cfg.SEARCH_MANY_MAX_TERMS:
+            raise ValueError(
+                'Too many search terms: %d (at most %d)' %
+                (len(search_terms), cfg.SEARCH_MANY_MAX_TERMS)
+            )
+
+        async def search(search_term):
+            started = time.monotonic()
+            result = error = None
+            try:
+                result = await self.fetch_with_magnet_links(
+                    search_term,
+                    deadline,
+                    magnet_top_k,
+                    magnet_top_k_sort,
+                    cache_control=cache_control
+                )
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            return {
+                'search_term': search_term,
+                'result': result,
+                'error': error,
+                'time': round(time.monotonic() - started, 3)
+            }
+
+        return list(await asyncio.gather(*map(search, search_terms)))
+
+    async def fetch_with_magnet_links_iter(
+            self,
+            search_term,
+            deadline=None,
+            cursor=None,
+            magnet_top_k=None,
+            magnet_top_k_sort=None
     ):
+        """
+        Yield results of every search engine page as soon as they arrive,
+        with `magnet_top_k` missing magnet links are fetched only for results
+        among the best K seen so far.
+        """
+        cursor = self._mk_cursor(search_term, cursor)
+        async for search_results in self._dl.fetch_pages_iter(
+                cursor,
+                self._search_progress,
+                self._aggregate_same_magnet_links,
+                fetch_magnet_links=self._fetch_missing_magnet_links,
+                concurrent=self._concurrent,
+                deadline=self._mk_deadline(deadline),
+                top_k=self._magnet_top_k
+                if magnet_top_k is None else magnet_top_k,
+                sort_key=magnet_top_k_sort or self._magnet_top_k_sort
+        ):
+            yield self._mk_output(search_results, cursor)
+
+    async def get_magnet_url(self, engine_name, link):
+        """
+        Resolve magnet link of a search result which has been left without
+        one, `link` is one of its `links`.
+        """
+        for cls in list(self._dl.engines.keys()) + self._dl.all_engines:
+            if cls.NAME == engine_name:
+                if link.startswith(cls.BASE_URL):
+                    link = link[len(cls.BASE_URL):]
+                return await self._dl.get_magnet_url(
+                    SearchResult(cls(), '', link, 0, 0, '')
+                )
+
+        raise ValueError('Unknown search engine: %s' % engine_name)
+
+    def health(self):
+        """
+        Scoreboard of search engines: circuit state, requests, failures,
+        success rate, average latency and last error.
+        """
+        return self._dl.health.to_dict()
+
+    def stats(self):
+        """
+        Statistics of searches: calls served by a search already in flight,
+        by the result cache and by the magnet cache, magnet link fetches
+        running and queued, rate limits of hosts and chosen mirrors.
+        """
+        stats = {
+            'singleflight': self._flights.to_dict(),
+            'magnet_fetch': {
+                'running': self._dl.scheduler.running,
+                'queued': self._dl.scheduler.queued
+            },
+            'rate_limits': self._dl.http_client.rate_limiter.to_dict(),
+            'mirrors': self._dl.mirrors.to_dict()
+        }
+        if self._results is not None:
+            stats['result_cache'] = dict(
+                self._results.stats, revalidating=len(self._revalidations)
+            )
+        if self._dl.magnet_cache is not None:
+            stats['magnet_cache'] = self._dl.magnet_cache.stats
+        return stats
+
+    async def close(self):
+        for task in self._revalidations.values():
+            task.cancel()
+        await self._dl.close()
+
+    def _mk_deadline(self, deadline):
+        return Deadline.mk(self._deadline if deadline is None else deadline)
+
+    async def _search(self, cursor, deadline, top_k, sort_key):
+        if self._search_slots is not None:
+            async with self._search_slots:
+                return await self._run_search(
+                    cursor, deadline, top_k, sort_key
+                )
+        return await self._run_search(cursor, deadline, top_k, sort_key)
+
+    async def _run_search(self, cursor, deadline, top_k, sort_key):
+        deadline = self._mk_deadline(deadline)
         search_results = await self._dl.fetch_pages(
-            search_term, self._search_progress
+            cursor, self._search_progress, deadline
         )
 
         if self._fetch_missing_magnet_links:
+            # Pick the top K results among the aggregated ones.
+            if top_k and self._aggregate_same_magnet_links:
+                search_results = self._dl.aggregate_same_magnets(
+                    search_results
+                )
             await self._dl.fetch_magnet_links(
-                search_results, self._concurrent
+                search_results,
+                self._concurrent,
+                deadline=deadline,
+                top_k=top_k,
+                sort_key=sort_key
             )
 
         if self._aggregate_same_magnet_links:
             search_results = self._dl.aggregate_same_magnets(search_results)
 
-        return self._mk_json_output(search_results, self._pretty_output)
+        return search_results, cursor.fork()
+
+    async def _cached_search(self, key, cursor, deadline, top_k, sort_key):
+        result = await self._search(cursor, deadline, top_k, sort_key)
+        # Don't keep results cut off by the deadline. Results without engines
+        # skipped because of an open circuit are kept, sites go down often.
+        if self._results is not None and not result[0].partial:
+            self._results.put(key, result)
+        return result
 
-    def _mk_json_output(self, search_results, pretty=False):
+    def _get_cached(self, key, cache_control=None):
+        if self._results is None:
+            return None, False
+
+        max_age = None
+        for directive in (cache_control or '').lower().split(','):
+            directive = directive.strip()
+            if directive == 'no-cache':
+                max_age = 0
+            elif directive.startswith('max-age='):
+                try:
+                    max_age = float(directive[len('max-age='):])
+                except ValueError:
+                    pass
+        if max_age == 0:
+            return None, False
+
+        return self._results.get(key, max_age)
+
+    def _revalidate(self, key, search):
+        """
+        Refresh the stale cached result of `key` in the background, unless
+        it's being refreshed already.
+        """
+        if key in self._revalidations:
+            return
+
+        task = asyncio.ensure_future(self._flights.do(key, search))
+        self._revalidations[key] = task
+        task.add_done_callback(partial(self._on_revalidated, key))
+
+    def _on_revalidated(self, key, task):
+        del self._revalidations[key]
+        # A failed refresh keeps the stale result, the next call tries again.
+        if not task.cancelled():
+            task.exception()
+
+    def _mk_flight_key(self, cursor, deadline, top_k, sort_key):
+        """
+        Key of identical searches: the same expression (ignoring case and
+        whitespace), excluded words, search engines and options.
+        """
+        return (
+            ' '.join((cursor.expression or '').lower().split()),
+            tuple(sorted(cursor.exclude)),
+            tuple(sorted(c.NAME for c in self._dl.engines)),
+            deadline if not isinstance(deadline, Deadline) else id(deadline),
+            top_k,
+            sort_key
+        )
+
+    def _mk_cursor(self, search_term, cursor_id=None):
+        """
+        New SearchCursor of `search_term` or the kept one with `cursor_id`.
+        """
+        if cursor_id is None:
+            cursor = SearchCursor(search_term)
+        else:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is None:
+                raise ValueError('Unknown or expired cursor: %s' % cursor_id)
+
+        return self._keep_cursor(cursor)
+
+    def _keep_cursor(self, cursor):
+        """
+        Keep `cursor` for later calls, the least recently used cursors are
+        dropped above MAX_CURSORS.
+        """
+        self._cursors[cursor.id] = cursor
+        self._cursors.move_to_end(cursor.id)
+        while len(self._cursors) > self.MAX_CURSORS:
+            self._cursors.popitem(last=False)
+
+        return cursor
+
+    def _mk_output(self, search_results, cursor=None):
         result = []
-        j = {'result': result}
+        j = {
+            'result': result,
+            'partial': getattr(search_results, 'partial', False),
+            'missed_engines': getattr(search_results, 'missed_engines', []),
+            'cursor': cursor.id if cursor is not None else None
+        }
         for sr in search_results:
             result.append(
                 {
@@ -614,4 +2265,6 @@ class Api(object):
                 }
             )
 
-        return json.dumps(j, indent=4 if pretty else None)
+        if self._json_strings:
+            return jsonenc.dumps(j, self._pretty_output)
+        return j
@@ -1,6 +1,6 @@
 import re
 
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 
 from tordl.core import BaseDl, SearchResult
 
@@ -9,12 +9,13 @@ class TpbParty(BaseDl):
     NAME = 'TPB'
     BASE_URL = 'https://tpb.party'
     SEARCH_URL = '%s/search/%s/%s/99/0' % (BASE_URL, '%s', '%s')
+    SEARCH_SCOPE = SoupStrainer('table', id='searchResult')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, str(self._current_index))
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, str(page))
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             trs = bs.find('table', id='searchResult').findAll('tr')[1:]
@@ -49,15 +50,17 @@ class LimeTorrents(BaseDl):
     NAME = 'Lime'
     BASE_URL = 'https://www.limetorrents.lol'
     SEARCH_URL = '%s/search/all/%s/seeds/%s/' % (BASE_URL, '%s', '%s')
+    SEARCH_SCOPE = SoupStrainer('tr', bgcolor=['#F4F4F4', '#FFFFFF'])
+    MAGNET_SCOPE = SoupStrainer(class_='csprite_dltorrent')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, str(self._current_index))
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, str(page))
 
     def _mk_magnet_url(self, link):
         return '%s%s' % (self.BASE_URL, link)
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         trs = bs.findAll('tr', attrs={'bgcolor': '#F4F4F4'})
         trs.extend(bs.findAll('tr', attrs={'bgcolor': '#FFFFFF'}))
@@ -79,8 +82,8 @@ class LimeTorrents(BaseDl):
 
         return result
 
-    async def _process_magnet_link(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+    def _parse_magnet_page(self, response):
+        bs = self._mk_soup(response, self.MAGNET_SCOPE)
         try:
             return bs.findAll(class_='csprite_dltorrent')[2].attrs['href']
         except Exception:
@@ -90,16 +93,31 @@ class LimeTorrents(BaseDl):
 class Dl1337xto(BaseDl):
     NAME = '1337x'
     BASE_URL = 'https://1337x.to'
+    MIRRORS = (
+        'https://1337x.st',
+        'https://x1337x.ws',
+        'https://x1337x.eu',
+        'https://x1337x.se'
+    )
     SEARCH_URL = '%s/search/%s/%s/' % (BASE_URL, '%s', '%s')
+    SEARCH_SCOPE = SoupStrainer(
+        class_='table-list table table-responsive table-striped'
+    )
+    MAGNET_SCOPE = SoupStrainer(
+        class_=[
+            'box-info torrent-detail-page',
+            'box-info torrent-detail-page series-torrent vpn-info-wrap'
+        ]
+    )
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, str(self._current_index))
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, str(page))
 
     def _mk_magnet_url(self, magnet_page_link):
         return '%s%s' % (self.BASE_URL, magnet_page_link)
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             trs = bs.find(
@@ -126,8 +144,8 @@ class Dl1337xto(BaseDl):
 
         return result
 
-    async def _process_magnet_link(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+    def _parse_magnet_page(self, response):
+        bs = self._mk_soup(response, self.MAGNET_SCOPE)
         try:
             x = bs.find(class_='box-info torrent-detail-page')
             if not x:
@@ -147,14 +165,15 @@ class NyaaTracker(BaseDl):
     SEARCH_URL = '%s/?f=0&c=0_0&q=%s&p=%s&s=seeders&o=desc' % (
         BASE_URL, '%s', '%s'
     )
+    SEARCH_SCOPE = SoupStrainer('tbody')
 
-    def _mk_search_url(self, expression):
+    def _mk_search_url(self, expression, page):
         return self.SEARCH_URL % (
-            expression, str(self._current_index)
+            expression, str(page)
         )
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             trs = bs.find('tbody').findAll('tr')
@@ -202,15 +221,17 @@ class TorrentDownload(BaseDl):
     NAME = 'TD'
     BASE_URL = 'https://www.torrentdownload.info'
     SEARCH_URL = f'{BASE_URL}/search?q=%s&p=%s'
+    SEARCH_SCOPE = SoupStrainer(class_='table2')
+    MAGNET_SCOPE = SoupStrainer(class_='tosa')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, str(self._current_index))
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, str(page))
 
     def _mk_magnet_url(self, link):
         return '%s%s' % (self.BASE_URL, link)
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             table = bs.findAll(class_='table2')[1]
@@ -234,8 +255,8 @@ class TorrentDownload(BaseDl):
 
         return result
 
-    async def _process_magnet_link(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+    def _parse_magnet_page(self, response):
+        bs = self._mk_soup(response, self.MAGNET_SCOPE)
         try:
             return bs.findAll(class_='tosa')[2].attrs['href']
         except Exception:
@@ -246,12 +267,13 @@ class SolidTorrents(BaseDl):
     NAME = 'ST'
     BASE_URL = 'https://solidtorrents.to'
     SEARCH_URL = f'{BASE_URL}/search?q=%s&page=%s'
+    SEARCH_SCOPE = SoupStrainer(class_='card search-result my-2')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, str(self._current_index))
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, str(page))
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             lis = bs.findAll(class_='card search-result my-2')[2:]
@@ -294,15 +316,16 @@ class GloTorrents(BaseDl):
     SEARCH_URL = (
         f'{BASE_URL}/search_results.php?search=%s&sort=seeders&order=desc&page=%s'
     )
+    SEARCH_SCOPE = SoupStrainer(class_='ttable_headinner')
 
-    def _mk_search_url(self, expression):
-        if self._current_index == 1:
+    def _mk_search_url(self, expression, page):
+        if page == 1:
             return self.SEARCH_URL[:-32] % expression
         else:
-            return self.SEARCH_URL % (expression, str(self._current_index))
+            return self.SEARCH_URL % (expression, str(page))
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             trs = bs.find(class_='ttable_headinner').findAll('tr')[1:]
@@ -338,12 +361,13 @@ class Torrentz2(BaseDl):
     NAME = 'Torr2'
     BASE_URL = 'https://torrentz2.nz'
     SEARCH_URL = f'{BASE_URL}/search?q=%s&page=%s'
+    SEARCH_SCOPE = SoupStrainer(class_='results')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, self._current_index)
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, page)
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             dls = bs.find(class_='results').findAll('dl')
@@ -379,16 +403,21 @@ class Torrentz2(BaseDl):
 class YourBitTorrent(BaseDl):
     NAME = 'YBT'
     BASE_URL = 'https://yourbittorrent.com'
+    MIRRORS = ('https://yourbittorrent2.com',)
     SEARCH_URL = f'{BASE_URL}/?q=%s&page=%s'
+    SEARCH_SCOPE = SoupStrainer(
+        class_='table table-bordered table-sm table-hover table-striped'
+    )
+    MAGNET_SCOPE = SoupStrainer(class_='col-md-4 text-center')
 
-    def _mk_search_url(self, expression):
-        return self.SEARCH_URL % (expression, self._current_index)
+    def _mk_search_url(self, expression, page):
+        return self.SEARCH_URL % (expression, page)
 
     def _mk_magnet_url(self, link):
         return '%s%s' % (self.BASE_URL, link)
 
     def _process_search(self, response):
-        bs = BeautifulSoup(response, features='html.parser')
+        bs = self._mk_soup(response, self.SEARCH_SCOPE)
         result = []
         try:
             trs = bs.find(
@@ -420,22 +449,27 @@ class YourBitTorrent(BaseDl):
 
         return result
 
-    async def _process_magnet_link(self, response):
-        """
-        This fetches URL to the torrent file, with transmission and qbitorrent it works
-        fine as a parameter.
-        """
-        bs = BeautifulSoup(response, features='html.parser')
-        tor_file_url = None
+    def _parse_magnet_page(self, response):
+        bs = self._mk_soup(response, self.MAGNET_SCOPE)
         try:
-            tor_file_url = bs.findAll(
+            return bs.findAll(
                 class_='col-md-4 text-center'
             )[1].find('a').attrs['href']
-
-            return await self._fetch_torrent_file(tor_file_url)
-
         except Exception:
-            pass
+            return None
+
+    async def _process_magnet_link(self, response):
+        """
+        This fetches the torrent file and makes a magnet link from it. If that
+        fails, URL to the torrent file is returned, with transmission and
+        qbitorrent it works fine as a parameter.
+        """
+        tor_file_url = await self._parse('_parse_magnet_page', response)
+        if tor_file_url:
+            try:
+                return await self._fetch_torrent_file(tor_file_url)
+            except Exception:
+                pass
 
         # return torrent file url at least, for some torrent clients it's enough
         return tor_file_url
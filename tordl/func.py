@@ -1,6 +1,5 @@
 import asyncio
 import curses
-import json
 import os
 import subprocess
 import sys
@@ -9,9 +8,10 @@ import pyperclip
 from functools import partial
 
 import tordl.config as cfg
-from tordl import core
+from tordl import bench, core, jsonenc
 from tordl.app import App
 from tordl.core import DlFacade, SearchEngineTest, Api
+from tordl.replay import ReplayServer
 from tordl.rpc import JsonRpcServer, JsonRpcClient
 
 
@@ -48,6 +48,13 @@ def direct_download(st, loop=None):
     loop = _mk_loop(loop)
 
     dl = DlFacade(loop)
+    try:
+        _direct_download(dl, st, loop)
+    finally:
+        loop.run_until_complete(dl.close())
+
+
+def _direct_download(dl, st, loop):
     print('Searching %s for "%s"...' % (','.join(cfg.SEARCH_ENGINES), st))
     results = loop.run_until_complete(dl.search(st))
     if results:
@@ -74,6 +81,30 @@ def test_search_engines(test_all=True, term=None, loop=None):
     loop.run_until_complete(test.run())
 
 
+def run_bench(
+        engine_names=None,
+        repeat=20,
+        output=None,
+        baseline=None,
+        threshold=20
+):
+    bench.run(engine_names or None, repeat, output, baseline, threshold / 100)
+
+
+def run_replay_server(
+        bind,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=0,
+        pages=1
+):
+    host, port = bind.split(':')
+    ReplayServer(
+        host, int(port), latency, jitter, error_rate, rate_limit, pages
+    ).start()
+
+
 def run_api(st, pretty_json=True, loop=None):
     if not st:
         print('No search term defined, cannot use --api option.')
@@ -88,14 +119,55 @@ def run_api(st, pretty_json=True, loop=None):
         cfg.AGGREGATE_SAME_MAGNET_LINKS,
         cfg.FETCH_MAGNET_LINKS_CONCURRENCE,
         None,
-        pretty_json
+        pretty_json,
+        cfg.SEARCH_DEADLINE,
+        cfg.MAGNET_TOP_K,
+        cfg.MAGNET_TOP_K_SORT,
+        json_strings=True
     )
 
-    sr = loop.run_until_complete(api.fetch_with_magnet_links(st))
+    try:
+        sr = loop.run_until_complete(api.fetch_with_magnet_links(st))
+    finally:
+        loop.run_until_complete(api.close())
 
     return sr
 
 
+def run_api_stream(st, pretty_json=False, loop=None):
+    if not st:
+        print('No search term defined, cannot use --api option.')
+        sys.exit(1)
+
+    loop = _mk_loop(loop)
+    asyncio.set_event_loop(loop)
+
+    api = Api(
+        None,
+        cfg.FETCH_MISSING_MAGNET_LINKS,
+        cfg.AGGREGATE_SAME_MAGNET_LINKS,
+        cfg.FETCH_MAGNET_LINKS_CONCURRENCE,
+        None,
+        pretty_json,
+        cfg.SEARCH_DEADLINE,
+        cfg.MAGNET_TOP_K,
+        cfg.MAGNET_TOP_K_SORT,
+        json_strings=True
+    )
+
+    try:
+        loop.run_until_complete(
+            _print_stream(api.fetch_with_magnet_links_iter(st))
+        )
+    finally:
+        loop.run_until_complete(api.close())
+
+
+async def _print_stream(stream):
+    async for output in stream:
+        print(output, flush=True)
+
+
 def run_rpc_server(loop=None):
     loop = _mk_loop(loop)
     server = JsonRpcServer(
@@ -107,14 +179,18 @@ def run_rpc_server(loop=None):
             cfg.AGGREGATE_SAME_MAGNET_LINKS,
             cfg.FETCH_MAGNET_LINKS_CONCURRENCE,
             None,
-            cfg.PRETTY_JSON
+            cfg.PRETTY_JSON,
+            cfg.SEARCH_DEADLINE,
+            cfg.MAGNET_TOP_K,
+            cfg.MAGNET_TOP_K_SORT,
+            json_strings=cfg.RPC_JSON_STRINGS
         ),
         loop=loop
     )
     server.start()
 
 
-def run_rpc_client(search_term, loop=None):
+def run_rpc_client(search_term, loop=None, stream=False):
     if not search_term:
         print('No search term provided.')
         sys.exit(1)
@@ -128,11 +204,24 @@ def run_rpc_client(search_term, loop=None):
         cfg.RPC_PASS,
         loop=loop
     )
-    sr = loop.run_until_complete(c.search(search_term))
-    if cfg.PRETTY_JSON:
-        j = json.loads(sr)
-        sr = json.dumps(j, indent=4)
-    print(sr)
+    if stream:
+        loop.run_until_complete(
+            _print_stream(_pretty_stream(c.search_stream(search_term)))
+        )
+    else:
+        print(_pretty(loop.run_until_complete(c.search(search_term))))
+
+
+def _pretty(sr):
+    # Servers with rpc_json_strings send search results as JSON strings.
+    if isinstance(sr, str):
+        sr = jsonenc.loads(sr)
+    return jsonenc.dumps(sr, cfg.PRETTY_JSON)
+
+
+async def _pretty_stream(stream):
+    async for sr in stream:
+        yield _pretty(sr)
 
 
 def run_curses_ui(st):
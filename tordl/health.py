@@ -0,0 +1,198 @@
+import time
+from collections import deque
+
+import tordl.config as cfg
+
+
+class LatencyHistogram(object):
+    """
+    Rolling window of response times of the last `size` requests, percentiles
+    (interpolated between the nearest samples) are known once `min_samples`
+    were recorded.
+    """
+
+    def __init__(self, size=None, min_samples=10):
+        self._samples = deque(
+            maxlen=cfg.LATENCY_WINDOW if size is None else size
+        )
+        self.min_samples = min_samples
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, latency):
+        self._samples.append(latency)
+
+    def percentile(self, p):
+        if len(self._samples) < self.min_samples:
+            return None
+
+        samples = sorted(self._samples)
+        rank = (len(samples) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(samples) - 1)
+        return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+
+class EngineHealth(object):
+    """
+    Request statistics of one search engine and its circuit breaker. After
+    `failure_threshold` consecutive failures the circuit opens and the engine
+    is skipped until a probe request (see DlFacade) succeeds.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    # Weight of the last request in the average latency.
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, name, failure_threshold=None, cool_down=None):
+        self.name = name
+        self.failure_threshold = cfg.CIRCUIT_FAILURE_THRESHOLD \
+            if failure_threshold is None else failure_threshold
+        self.cool_down = cfg.CIRCUIT_COOL_DOWN \
+            if cool_down is None else cool_down
+
+        self.state = self.CLOSED
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.last_error = None
+        self.opened_at = None
+        self.latencies = LatencyHistogram()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+        self.on_open = None
+
+    @property
+    def available(self):
+        return self.state == self.CLOSED
+
+    @property
+    def success_rate(self):
+        if not self.requests:
+            return None
+        return (self.requests - self.failures) / self.requests
+
+    def success(self, latency=None):
+        self.requests += 1
+        self.consecutive_failures = 0
+        if latency is not None:
+            self.observe(latency)
+        self.state = self.CLOSED
+        self.opened_at = None
+
+    def observe(self, latency):
+        """
+        Record the response time of a request.
+        """
+        self.latencies.add(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+
+    def failure(self, error):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error) or type(error).__name__
+
+        if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and
+                self.failure_threshold and
+                self.consecutive_failures >= self.failure_threshold
+        ):
+            self.open()
+
+    def open(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        if self.on_open is not None:
+            self.on_open(self)
+
+    def half_open(self):
+        self.state = self.HALF_OPEN
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'requests': self.requests,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'success_rate': self.success_rate,
+            'latency': self.latency,
+            'p50': self.latencies.percentile(50),
+            'p95': self.latencies.percentile(95),
+            'p99': self.latencies.percentile(99),
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'retries': self.retries,
+            'last_error': self.last_error,
+            'opened_at': self.opened_at
+        }
+
+    def __str__(self):
+        return '%-9s %4s %7s' % (
+            self.state,
+            '-' if self.success_rate is None else
+            '%d%%' % (self.success_rate * 100),
+            '-' if self.latency is None else '%dms' % (self.latency * 1000)
+        )
+
+
+class HealthBoard(object):
+    """
+    Scoreboard of EngineHealth by search engine name, `on_open` is called with
+    EngineHealth of every engine whose circuit opens.
+    """
+
+    def __init__(self, on_open=None):
+        self._engines = {}
+        self._on_open = on_open
+
+    def __getitem__(self, name):
+        health = self._engines.get(name)
+        if health is None:
+            health = self._engines[name] = EngineHealth(name)
+            health.on_open = self._on_open
+        return health
+
+    def available(self, name):
+        health = self._engines.get(name)
+        return health is None or health.available
+
+    def to_dict(self):
+        return {name: h.to_dict() for name, h in self._engines.items()}
+
+    def format(self):
+        lines = [
+            '%-8s %-9s %8s %8s %8s %10s %8s %7s %7s  %s' % (
+                'Engine', 'Circuit', 'Requests', 'Failures', 'Success',
+                'Latency', 'p95', 'Hedged', 'Retries', 'Last error'
+            )
+        ]
+        for name, h in sorted(self._engines.items()):
+            lines.append(
+                '%-8s %-9s %8d %8d %8s %10s %8s %7d %7d  %s' % (
+                    name,
+                    h.state,
+                    h.requests,
+                    h.failures,
+                    '-' if h.success_rate is None else
+                    '%.0f%%' % (h.success_rate * 100),
+                    '-' if h.latency is None else
+                    '%.0fms' % (h.latency * 1000),
+                    '-' if h.latencies.percentile(95) is None else
+                    '%.0fms' % (h.latencies.percentile(95) * 1000),
+                    h.hedged,
+                    h.retries,
+                    h.last_error or ''
+                )
+            )
+
+        return '\n'.join(lines)
@@ -0,0 +1,28 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, pretty=False):
+    """
+    Serialize `obj` to a JSON string, with orjson when it's installed.
+    """
+    if orjson is not None and not pretty:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, indent=4 if pretty else None)
+
+
+def dumpb(obj, pretty=False):
+    """
+    Serialize `obj` to JSON encoded in UTF-8, ready to be sent.
+    """
+    if orjson is not None and not pretty:
+        return orjson.dumps(obj)
+    return json.dumps(obj, indent=4 if pretty else None).encode()
+
+
+def loads(s):
+    return orjson.loads(s) if orjson is not None else json.loads(s)
@@ -0,0 +1,119 @@
+import json
+import os
+import time
+
+import tordl.config as cfg
+
+
+class MirrorTable(object):
+    """
+    Mirror chosen for every search engine with more mirrors, with their
+    measured latency and consecutive failures. Choices are remembered between
+    runs in `path` for `ttl` seconds.
+    """
+    # Consecutive failures after which the chosen mirror is dropped.
+    FAILOVER_AFTER = 2
+    # Seconds before mirrors which all failed are measured again, doubled
+    # with every failed measurement up to REMEASURE_MAX.
+    REMEASURE_AFTER = 30
+    REMEASURE_MAX = 1800
+
+    def __init__(self, path=None, ttl=None):
+        self._path = path or cfg.CFG_MIRRORS_FILE
+        self._ttl = cfg.MIRROR_TTL if ttl is None else ttl
+
+        self._chosen = {}
+        self._latency = {}
+        self._failures = {}
+        self._failed_measurements = {}
+
+        self._load()
+
+    def chosen(self, name):
+        chosen = self._chosen.get(name)
+        if chosen is None:
+            return None
+        if self._ttl and time.time() - chosen['time'] > self._ttl:
+            return None
+        return chosen['url']
+
+    def can_measure(self, name):
+        """
+        False while mirrors of engine `name` which all failed are backed off.
+        """
+        failed = self._failed_measurements.get(name)
+        return failed is None or time.monotonic() >= failed[1]
+
+    def measurement_failed(self, name):
+        count = self._failed_measurements.get(name, (0, None))[0]
+        self._failed_measurements[name] = (
+            count + 1,
+            time.monotonic() + min(
+                self.REMEASURE_AFTER * 2 ** count, self.REMEASURE_MAX
+            )
+        )
+
+    def choose(self, name, url):
+        self._failed_measurements.pop(name, None)
+        self._chosen[name] = {
+            'url': url,
+            'latency': self._latency.get(url),
+            'time': time.time()
+        }
+        self._save()
+
+    def forget(self, name):
+        if self._chosen.pop(name, None) is not None:
+            self._save()
+
+    def rank(self, urls):
+        """
+        Order `urls` from the most promising: healthy ones by measured latency
+        (unmeasured ones in the given order), failing ones last.
+        """
+        return sorted(
+            urls,
+            key=lambda url: (
+                self._failures.get(url, 0) >= self.FAILOVER_AFTER,
+                self._latency.get(url, float('inf'))
+            )
+        )
+
+    def success(self, url, latency=None):
+        self._failures[url] = 0
+        if latency is not None:
+            self._latency[url] = latency
+
+    def failure(self, name, url):
+        self._failures[url] = self._failures.get(url, 0) + 1
+        if self._failures[url] >= self.FAILOVER_AFTER and \
+                self.chosen(name) == url:
+            self.forget(name)
+
+    def to_dict(self):
+        return {
+            name: dict(
+                chosen,
+                failures=self._failures.get(chosen['url'], 0)
+            ) for name, chosen in self._chosen.items()
+        }
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                self._chosen = json.load(f)
+        except (OSError, ValueError):
+            self._chosen = {}
+
+        for chosen in self._chosen.values():
+            if chosen.get('latency') is not None:
+                self._latency[chosen['url']] = chosen['latency']
+
+    def _save(self):
+        try:
+            tmp = '%s.tmp' % self._path
+            with open(tmp, 'w') as f:
+                json.dump(self._chosen, f, indent=4)
+            os.replace(tmp, self._path)
+        except OSError:
+            pass
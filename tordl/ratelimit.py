@@ -0,0 +1,113 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import tordl.config as cfg
+
+
+class RateLimiter(object):
+    """
+    Token bucket refilled with `rate` tokens per second up to `burst` tokens.
+    Callers of `acquire` without a token available are queued (in the order
+    they came) instead of being rejected.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1, burst or rate)
+        self.waiting = 0
+
+        self._tokens = self.burst
+        self._t = time.monotonic()
+
+    @property
+    def busy(self):
+        self._refill()
+        return self._tokens < 1
+
+    async def acquire(self):
+        """
+        Wait for a token, return the number of seconds waited.
+        """
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0
+
+        # Tokens below zero are reserved by the callers already waiting.
+        delay = -self._tokens / self.rate
+        self.waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._tokens += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        return delay
+
+    def pause(self, seconds):
+        """
+        Hold back requests not started yet for `seconds`, e.g. when the site
+        asks to slow down.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._t) * self.rate
+        )
+        self._t = now
+
+
+class HostRateLimiter(object):
+    """
+    RateLimiter of every host, `rate` requests per second with bursts of up to
+    `burst` requests, `hosts` maps host names to their own [rate, burst].
+    A rate of 0 disables rate limiting. Requests can be put into a bucket of
+    their own with `key` instead of the host of their URL.
+    """
+
+    def __init__(self, rate=None, burst=None, hosts=None):
+        self.rate = cfg.HTTP_RATE_LIMIT if rate is None else rate
+        self.burst = cfg.HTTP_RATE_BURST if burst is None else burst
+        self.hosts = cfg.HTTP_RATE_LIMIT_HOST if hosts is None else hosts
+
+        self._limiters = {}
+
+    def __getitem__(self, key):
+        if key not in self._limiters:
+            rate, burst = self.hosts.get(key, (self.rate, self.burst))
+            self._limiters[key] = RateLimiter(rate, burst) if rate else None
+        return self._limiters[key]
+
+    async def acquire(self, url, key=None):
+        limiter = self[key or urlsplit(url).netloc]
+        return await limiter.acquire() if limiter is not None else 0
+
+    def busy(self, url, key=None):
+        limiter = self[key or urlsplit(url).netloc]
+        return limiter is not None and limiter.busy
+
+    def pause(self, url, seconds=None, key=None):
+        """
+        Pause requests to the host of `url` for `seconds`, by default until
+        the bucket would be full again.
+        """
+        limiter = self[key or urlsplit(url).netloc]
+        if limiter is not None:
+            limiter.pause(
+                limiter.burst / limiter.rate if seconds is None else seconds
+            )
+
+    def to_dict(self):
+        return {
+            host: {
+                'rate': limiter.rate,
+                'burst': limiter.burst,
+                'waiting': limiter.waiting
+            } for host, limiter in self._limiters.items() if limiter is not None
+        }
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import inspect
+import random
+import re
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp.web import Application, Response, json_response
+
+from tordl import engines
+from tordl.bench import DETAIL_FIXTURE, SEARCH_FIXTURE, load_fixture
+from tordl.bencode import encode
+from tordl.core import BaseDl
+
+EMPTY_PAGE = '<!DOCTYPE html>\n<html><body><p>No results.</p></body></html>\n'
+RE_HREF = re.compile(r'href="((?:https?://[^/"]+)?/[^"]*)"')
+RE_BTIH = re.compile(r'btih:[0-9A-Za-z]{32,40}')
+RE_TORRENT_NAME = re.compile(r'[^/"]+(?=\.torrent")')
+
+
+def mk_unique(page, salt):
+    """
+    Replace info hashes and torrent file names in `page` with ones derived
+    from `salt`, so results of different pages aren't aggregated together.
+    """
+    def digest(m):
+        return hashlib.sha1(
+            ('%s %s' % (salt, m.group(0))).encode('utf-8')
+        ).hexdigest()
+
+    page = RE_BTIH.sub(lambda m: 'btih:%s' % digest(m), page)
+    return RE_TORRENT_NAME.sub(digest, page)
+
+
+class ReplayEngine(object):
+    """
+    Stored pages of one search engine and the search URL pattern used to
+    recognize search requests (and their page numbers).
+    """
+
+    def __init__(self, dl_class):
+        self.name = dl_class.NAME
+        self.search_page = load_fixture(self.name, SEARCH_FIXTURE)
+        self.detail_page = load_fixture(self.name, DETAIL_FIXTURE)
+
+        path = dl_class.SEARCH_URL[len(dl_class.BASE_URL):]
+        self.search_prefix = path.split('%s')[0]
+        parts = [re.escape(p) for p in path.split('%s')]
+        self._re_search = re.compile(
+            '%s%s' % (parts[0], ''.join('(.*?)' + p for p in parts[1:]))
+        )
+
+    def page_num(self, path_qs):
+        m = self._re_search.fullmatch(path_qs)
+        if m and m.lastindex > 1 and m.group(m.lastindex).isdigit():
+            return int(m.group(m.lastindex))
+        return 1
+
+    def mk_search_page(self, num):
+        """
+        Search page number `num`, links and magnet links of the stored page
+        are made unique to the page, so pages don't look like repeated ones.
+        """
+        if num == 1:
+            return self.search_page
+
+        return mk_unique(
+            RE_HREF.sub(
+                lambda m: 'href="%s%sreplay_page=%d"' % (
+                    m.group(1), '&amp;' if '?' in m.group(1) else '?', num
+                ),
+                self.search_page
+            ),
+            num
+        )
+
+    def mk_detail_page(self, path):
+        """
+        Detail page of the torrent at `path`, with a magnet link (or torrent
+        file) of its own.
+        """
+        return mk_unique(self.detail_page, path)
+
+
+class TokenBucket(object):
+    def __init__(self, rate):
+        self._rate = rate
+        self._tokens = rate
+        self._t = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._rate, self._tokens + (now - self._t) * self._rate
+        )
+        self._t = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class ReplayServer(object):
+    """
+    Stand-in for the torrent sites, serves stored pages of every engine from
+    tordl.engines under /<engine NAME>/, so DlFacade, Api or JsonRpcServer can
+    be load tested offline (see config REPLAY_URL). Responses are delayed by
+    `latency` +- `jitter` seconds, fail with 503 with `error_rate` probability
+    and with 429 above `rate_limit` requests per second per engine. The first
+    `pages` search result pages are served, the following ones are empty.
+    """
+
+    def __init__(
+            self,
+            host='127.0.0.1',
+            port=57100,
+            latency=0.0,
+            jitter=0.0,
+            error_rate=0.0,
+            rate_limit=0,
+            pages=1,
+            seed=None
+    ):
+        self._host = host
+        self._port = port
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._rate_limit = rate_limit
+        self._pages = pages
+        self._random = random.Random(seed)
+
+        self._engines = {}
+        for _, obj in inspect.getmembers(engines, inspect.isclass):
+            if issubclass(obj, BaseDl) and obj is not BaseDl:
+                engine = ReplayEngine(obj)
+                if engine.search_page is not None:
+                    self._engines[engine.name] = engine
+        self._buckets = {}
+        self._stats = Counter()
+
+        self._app = Application()
+        self._app.router.add_get('/_stats', self._handle_stats)
+        self._app.router.add_get('/{engine}/{path:.*}', self._handle_request)
+
+    @property
+    def app(self):
+        return self._app
+
+    @property
+    def stats(self):
+        return dict(self._stats)
+
+    def start(self):
+        print(
+            'Replaying %s on http://%s:%s/<engine>/' % (
+                ', '.join(sorted(self._engines)), self._host, self._port
+            )
+        )
+        aiohttp.web.run_app(
+            self._app,
+            host=self._host,
+            port=self._port,
+            reuse_address=True,
+            print=None
+        )
+
+    async def _handle_stats(self, request):
+        return json_response(self.stats)
+
+    async def _handle_request(self, request):
+        name = request.match_info['engine']
+        engine = self._engines.get(name)
+        if engine is None:
+            return self._response(name, Response(status=404))
+
+        if self._rate_limit:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                bucket = self._buckets[name] = TokenBucket(self._rate_limit)
+            if not bucket.take():
+                return self._response(name, Response(status=429))
+
+        delay = self._latency + self._random.uniform(
+            -self._jitter, self._jitter
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self._random.random() < self._error_rate:
+            return self._response(name, Response(status=503))
+
+        path_qs = request.raw_path[len(name) + 1:]
+        if path_qs.endswith('.torrent'):
+            return self._response(
+                name,
+                Response(
+                    body=self._mk_torrent(path_qs),
+                    content_type='application/x-bittorrent'
+                )
+            )
+        elif path_qs == '/':
+            # Front page, requested by circuit breaker probes.
+            page = EMPTY_PAGE
+        elif path_qs.startswith(engine.search_prefix):
+            num = engine.page_num(path_qs)
+            page = engine.mk_search_page(num) \
+                if num <= self._pages else EMPTY_PAGE
+        elif engine.detail_page is not None:
+            page = engine.mk_detail_page(path_qs)
+        else:
+            return self._response(name, Response(status=404))
+
+        return self._response(
+            name, Response(text=page, content_type='text/html')
+        )
+
+    def _response(self, name, response):
+        self._stats['%s %d' % (name, response.status)] += 1
+        return response
+
+    @staticmethod
+    def _mk_torrent(path):
+        name = path.rsplit('/', 1)[-1][:-len('.torrent')]
+        return encode({
+            'announce': 'udp://tracker.opentrackr.org:1337/announce',
+            'info': {
+                'name': name,
+                'length': 1024 ** 2,
+                'piece length': 256 * 1024,
+                'pieces': hashlib.sha1(path.encode('utf-8')).digest() * 4
+            }
+        })
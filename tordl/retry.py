@@ -0,0 +1,88 @@
+import asyncio
+import random
+import ssl
+from contextvars import ContextVar
+
+from aiohttp import ClientConnectionError, ClientConnectorCertificateError
+from aiohttp import ClientPayloadError
+
+import tordl.config as cfg
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+# RetryBudget of the search the current task belongs to.
+current_budget = ContextVar('retry_budget', default=None)
+
+
+def is_retryable(error):
+    """
+    Transient errors worth another try: timeouts, dropped connections, TLS
+    hiccups and 408, 425, 429, 500, 502, 503 and 504 responses.
+    """
+    if isinstance(
+            error,
+            (ClientConnectorCertificateError, ssl.SSLCertVerificationError)
+    ):
+        return False
+    if isinstance(
+            error,
+            (
+                asyncio.TimeoutError,
+                ClientConnectionError,
+                ClientPayloadError,
+                ConnectionError,
+                ssl.SSLError
+            )
+    ):
+        return True
+    return getattr(error, 'status', None) in RETRYABLE_STATUS
+
+
+def backoff(attempt, base=None, cap=None):
+    """
+    Exponential backoff of retry `attempt` (from 0) with full jitter, so
+    retries of requests failed together don't hit the site together again.
+    """
+    base = cfg.RETRY_BACKOFF_BASE if base is None else base
+    cap = cfg.RETRY_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryBudget(object):
+    """
+    Retries left for one search, shared by all of its requests, so retries of
+    failing engines can't pile up. No retry is allowed when its backoff
+    wouldn't end before the search `deadline`.
+    """
+
+    def __init__(self, retries=None, deadline=None):
+        self.retries = cfg.RETRY_BUDGET if retries is None else retries
+        self.deadline = deadline
+        self.used = 0
+
+    @property
+    def remaining(self):
+        """
+        Seconds left until the search deadline, None without a deadline.
+        """
+        return self.deadline.remaining if self.deadline else None
+
+    def take(self, delay):
+        if self.used >= self.retries:
+            return False
+
+        remaining = self.remaining
+        if remaining is not None and remaining <= delay:
+            return False
+
+        self.used += 1
+        return True
+
+
+async def with_budget(budget, coro):
+    """
+    Await `coro` with `budget` as the current retry budget, meant to run as
+    a task of its own, so the budget doesn't leak to other tasks.
+    """
+    current_budget.set(budget)
+    return await coro
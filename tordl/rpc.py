@@ -7,8 +7,9 @@ from pprint import pformat
 
 import aiohttp
 from aiohttp import ClientSession
-from aiohttp.web import Application, json_response
+from aiohttp.web import Application, Response, StreamResponse
 
+from tordl import jsonenc
 from tordl.func import Api
 
 
@@ -28,29 +29,34 @@ def init_logger(log_stdout, name):
 
 
 class RpcMsg(object):
-    JSON_ERROR = {
-        'jsonrpc': '2.0',
-        'error': {
-            'message': None,
-            'code': None
-        },
-        'result': None,
-        'id': 0
-    }
-    JSON_RESPONSE = {
-        'jsonrpc': '2.0',
-        'error': None,
-        'result': None,
-        'id': 0
-    }
     ERR_INVALID_HTTP_METHOD = 1, 'Invalid HTTP method (use POST)'
     ERR_MALFORMED_JSON = 2, 'Malformed JSON: '
     ERR_INVALID_RPC_METHOD = 3, 'Invalid RPC method name: '
     ERR_GENERIC = 4, 'Error: '
+    ERR_EMPTY_BATCH = 5, 'Empty batch'
+    ERR_NOT_IN_BATCH = 6, 'RPC method not allowed in a batch: '
+
+    @staticmethod
+    def response(result, id_=0):
+        return {'jsonrpc': '2.0', 'error': None, 'result': result, 'id': id_}
+
+    @staticmethod
+    def error(code, message, id_=0):
+        return {
+            'jsonrpc': '2.0',
+            'error': {'message': message, 'code': code},
+            'result': None,
+            'id': id_
+        }
 
 
 class JsonRpcServer(object):
     METHOD_SEARCH = 'search'
+    METHOD_SEARCH_STREAM = 'search_stream'
+    METHOD_SEARCH_MANY = 'search_many'
+    METHOD_GET_MAGNET_URL = 'get_magnet_url'
+    METHOD_HEALTH = 'health'
+    METHOD_STATS = 'stats'
 
     def __init__(
             self,
@@ -73,6 +79,7 @@ class JsonRpcServer(object):
         self._app = Application()
         self._app.router.add_post('/', self._handle_request)
         self._app.router.add_get('', self._handle_request)
+        self._app.on_cleanup.append(self._on_cleanup)
 
         self._api = api or Api()
 
@@ -85,51 +92,164 @@ class JsonRpcServer(object):
             reuse_port=True
         )
 
+    async def _on_cleanup(self, app):
+        await self._api.close()
+
     async def _handle_request(self, request):
         if request.method == 'POST':
             try:
-                request = await request.content.read()
+                body = await request.content.read()
 
-                self._log.debug('Message received: %s' % request)
-                j = json.loads(request)
+                self._log.debug('Message received: %s' % body)
+                j = jsonenc.loads(body)
 
-                method = j['method']
-                id_ = j['id']
-                params = j['params']
-
-                if method == self.METHOD_SEARCH:
-                    sr = await self._api.fetch_with_magnet_links(params[0])
-                    m = self._mk_msg(
-                        sr,
-                        id_=id_
+                if isinstance(j, list):
+                    responses = await self._call_batch(j)
+                    # A batch of notifications only gets no response.
+                    if not responses:
+                        return Response(status=204)
+                    return self._json_response(responses)
+                elif isinstance(j, dict) and 'id' not in j:
+                    # Notification, no response.
+                    await self._call(j)
+                    return Response(status=204)
+                elif j['method'] == self.METHOD_SEARCH_STREAM:
+                    search_term, options = self._parse_search_params(
+                        j['params']
+                    )
+                    return await self._stream_response(
+                        request,
+                        self._api.fetch_with_magnet_links_iter(
+                            search_term,
+                            deadline=options.get('deadline'),
+                            cursor=options.get('cursor'),
+                            magnet_top_k=options.get('top_k'),
+                            magnet_top_k_sort=options.get('top_k_sort')
+                        ),
+                        j['id']
                     )
-                    return json_response(data=m)
                 else:
-                    self._log_err('Invalid RPC method: %s' % method)
-                    return json_response(data=self._mk_msg(
-                        None,
-                        RpcMsg.ERR_INVALID_RPC_METHOD,
-                        method,
-                        id_
-                    ))
+                    return self._json_response(await self._call(j))
             except json.decoder.JSONDecodeError as e:
                 self._log_err(e)
-                return json_response(data=self._mk_msg(
+                return self._json_response(self._mk_msg(
                     None, RpcMsg.ERR_MALFORMED_JSON, e
                 ))
             except Exception as e:
                 self._log_err(e)
                 try:
-                    return json_response(data=self._mk_msg(
+                    return self._json_response(self._mk_msg(
                         None, RpcMsg.ERR_GENERIC, e
                     ))
                 except BaseException:
                     pass
 
         else:
-            return json_response(
-                data=self._mk_msg(None, RpcMsg.ERR_INVALID_HTTP_METHOD)
+            return self._json_response(
+                self._mk_msg(None, RpcMsg.ERR_INVALID_HTTP_METHOD)
+            )
+
+    async def _call_batch(self, calls):
+        """
+        Run calls of a batch concurrently, responses are in the order of
+        the calls. Notifications (calls without an id) get no response.
+        """
+        if not calls:
+            return self._mk_msg(None, RpcMsg.ERR_EMPTY_BATCH)
+
+        responses = await asyncio.gather(
+            *(self._call(j, batch=True) for j in calls)
+        )
+        return [
+            m for j, m in zip(calls, responses)
+            if not isinstance(j, dict) or 'id' in j
+        ]
+
+    async def _call(self, j, batch=False):
+        id_ = j.get('id', 0) if isinstance(j, dict) else 0
+        try:
+            method = j['method']
+            params = j.get('params') or []
+
+            if method == self.METHOD_SEARCH:
+                search_term, options = self._parse_search_params(params)
+                sr = await self._api.fetch_with_magnet_links(
+                    search_term,
+                    deadline=options.get('deadline'),
+                    magnet_top_k=options.get('top_k'),
+                    magnet_top_k_sort=options.get('top_k_sort'),
+                    cursor=options.get('cursor'),
+                    cache_control=options.get('cache_control')
+                )
+                return self._mk_msg(sr, id_=id_)
+            elif method == self.METHOD_SEARCH_MANY:
+                search_terms, options = self._parse_search_params(params)
+                results = await self._api.search_many(
+                    search_terms,
+                    deadline=options.get('deadline'),
+                    magnet_top_k=options.get('top_k'),
+                    magnet_top_k_sort=options.get('top_k_sort'),
+                    cache_control=options.get('cache_control')
+                )
+                return self._mk_msg(results, id_=id_)
+            elif method == self.METHOD_GET_MAGNET_URL:
+                magnet_url = await self._api.get_magnet_url(*params[:2])
+                return self._mk_msg(magnet_url or '', id_=id_)
+            elif method == self.METHOD_HEALTH:
+                return self._mk_msg(self._api.health(), id_=id_)
+            elif method == self.METHOD_STATS:
+                return self._mk_msg(self._api.stats(), id_=id_)
+            elif method == self.METHOD_SEARCH_STREAM and batch:
+                return self._mk_msg(
+                    None, RpcMsg.ERR_NOT_IN_BATCH, method, id_
+                )
+            else:
+                self._log_err('Invalid RPC method: %s' % method)
+                return self._mk_msg(
+                    None, RpcMsg.ERR_INVALID_RPC_METHOD, method, id_
+                )
+        except Exception as e:
+            self._log_err(e)
+            return self._mk_msg(None, RpcMsg.ERR_GENERIC, e, id_)
+
+    @staticmethod
+    def _parse_search_params(params):
+        """
+        Search methods expect the search term, optionally followed by
+        an object with search options.
+        """
+        options = params[1] if len(params) > 1 and params[1] else {}
+        return params[0], options
+
+    async def _stream_response(self, request, results, id_):
+        """
+        Write one JSON RPC response per line, as the results arrive.
+        """
+        response = StreamResponse(
+            headers={'Content-Type': 'application/x-ndjson'}
+        )
+        await response.prepare(request)
+        try:
+            async for sr in results:
+                await self._write_line(response, self._mk_msg(sr, id_=id_))
+        except Exception as e:
+            self._log_err(e)
+            await self._write_line(
+                response, self._mk_msg(None, RpcMsg.ERR_GENERIC, e, id_)
             )
+        await response.write_eof()
+
+        return response
+
+    @staticmethod
+    def _json_response(msg):
+        return Response(
+            body=jsonenc.dumpb(msg), content_type='application/json'
+        )
+
+    @staticmethod
+    async def _write_line(response, msg):
+        await response.write(jsonenc.dumpb(msg) + b'\n')
 
     def _log_err(self, e, traceback=False):
         if type(e) is BaseException:
@@ -143,15 +263,12 @@ class JsonRpcServer(object):
 
     def _mk_msg(self, response=None, err_msg=None, err_add=None, id_=0):
         if response is not None:
-            m = RpcMsg.JSON_RESPONSE
-            m['result'] = response
-        else:
-            m = RpcMsg.JSON_ERROR
-            m['error']['code'], m['error']['message'] = err_msg
-            if err_add:
-                m['error']['message'] += ' %s' % err_add
-        m['id'] = id_
-        return m
+            return RpcMsg.response(response, id_)
+
+        code, message = err_msg
+        if err_add:
+            message += ' %s' % err_add
+        return RpcMsg.error(code, message, id_)
 
 
 class JsonRpcClient(object):
@@ -174,64 +291,131 @@ class JsonRpcClient(object):
         self._id = 0
         self._stop_event = Event()
 
-    async def search(self, search_term):
-        return await self._fetch('search', search_term)
+    async def search(self, search_term, **options):
+        return await self._fetch('search', search_term, options)
+
+    async def search_many(self, search_terms, **options):
+        return await self._fetch('search_many', search_terms, options)
+
+    async def get_magnet_url(self, engine_name, link):
+        return await self._fetch('get_magnet_url', engine_name, link)
+
+    async def health(self):
+        return await self._fetch('health')
+
+    async def stats(self):
+        return await self._fetch('stats')
+
+    async def search_stream(self, search_term, **options):
+        async for result in self._fetch_stream(
+                'search_stream', search_term, options
+        ):
+            yield result
+
+    async def batch(self, *calls):
+        """
+        Send `calls` ((method, params...) tuples) in one request, return their
+        results in the order of `calls`.
+        """
+        if not self._stop_event.is_set():
+            requests = [
+                self._mk_request(method, params) for method, *params in calls
+            ]
+            try:
+                async with ClientSession(loop=self._loop) as session:
+                    async with session.post(
+                            self._url, json=requests
+                    ) as response:
+                        responses = {
+                            r['id']: r for r in jsonenc.loads(
+                                await response.read()
+                            )
+                        }
+                        return [
+                            self._process_response(
+                                responses[r['id']], r['method'], r['params']
+                            ) for r in requests
+                        ]
+            except BaseException as e:
+                self._log.error('%s: %s' % (type(e), e))
 
     def stop(self):
         self._stop_event.set()
 
     async def _fetch(self, method, *params):
         if not self._stop_event.is_set():
-            self._id += 1
-
-            json_data = {
-                'jsonrpc': '2.0',
-                'method': method,
-                'params': params,
-                'id': self._id
-            }
-
-            self._log.debug(
-                'Calling RPC id=%d, method=%s, params=%s' %
-                (
-                    self._id,
-                    method,
-                    str(params)
-                )
-            )
+            json_data = self._mk_request(method, params)
             try:
                 async with ClientSession(loop=self._loop) as session:
                     async with session.post(
                             self._url, json=json_data
                     ) as response:
                         r = response.read()
-                        result = json.loads(await r)
-                        if result['error'] is not None:
-                            e = result['error']
-                            self._log.error(
-                                'RPC Error: id=%d, %s, code=%s, method=%s, '
-                                'params=%s' % (
-                                    self._id,
-                                    e['message'],
-                                    e['code'],
-                                    method,
-                                    str(params)
-                                )
-                            )
-                            return e
-                        else:
-                            result = result['result']
-                            print(result)
-                            self._log.debug(
-                                'RPC Response received id=%d, method=%s, '
-                                'params=%s, '
-                                'result=%s' % (
-                                    self._id,
-                                    method,
-                                    str(params),
-                                    pformat(result)
+                        return self._process_response(
+                            jsonenc.loads(await r), method, params
+                        )
+            except BaseException as e:
+                self._log.error('%s: %s' % (type(e), e))
+
+    async def _fetch_stream(self, method, *params):
+        if not self._stop_event.is_set():
+            json_data = self._mk_request(method, params)
+            try:
+                async with ClientSession(loop=self._loop) as session:
+                    async with session.post(
+                            self._url, json=json_data
+                    ) as response:
+                        async for line in response.content:
+                            if line.strip():
+                                yield self._process_response(
+                                    jsonenc.loads(line), method, params
                                 )
-                            )
-                            return result
             except BaseException as e:
                 self._log.error('%s: %s' % (type(e), e))
+
+    def _mk_request(self, method, params):
+        self._id += 1
+
+        self._log.debug(
+            'Calling RPC id=%d, method=%s, params=%s' %
+            (
+                self._id,
+                method,
+                str(params)
+            )
+        )
+
+        return {
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params,
+            'id': self._id
+        }
+
+    def _process_response(self, result, method, params):
+        if result['error'] is not None:
+            e = result['error']
+            self._log.error(
+                'RPC Error: id=%d, %s, code=%s, method=%s, '
+                'params=%s' % (
+                    self._id,
+                    e['message'],
+                    e['code'],
+                    method,
+                    str(params)
+                )
+            )
+            return e
+        else:
+            result = result['result']
+            self._log.debug(
+                'RPC Response received id=%d, method=%s, '
+                'params=%s, '
+                'result=%s' % (
+                    self._id,
+                    method,
+                    str(params),
+                    pformat(result)
+                )
+            )
+            return result
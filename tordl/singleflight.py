@@ -0,0 +1,63 @@
+import asyncio
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key into one: the first call
+    runs, the others wait for its result (or error). The call keeps running
+    as long as somebody waits for it.
+    """
+
+    class Flight(object):
+        def __init__(self, task):
+            self.task = task
+            self.waiters = 0
+
+    def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.flights = 0
+        self.deduplicated = 0
+
+    @property
+    def in_flight(self):
+        return len(self._flights)
+
+    async def do(self, key, coro_fn):
+        """
+        Return the result of `coro_fn()`, or of the call with the same `key`
+        already in flight, and whether the result is shared.
+        """
+        self.calls += 1
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.deduplicated += 1
+        else:
+            self.flights += 1
+            flight = self._flights[key] = self.Flight(
+                asyncio.ensure_future(coro_fn())
+            )
+            flight.task.add_done_callback(lambda _: self._done(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'flights': self.flights,
+            'deduplicated': self.deduplicated,
+            'in_flight': self.in_flight
+        }
+
+    def _done(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]